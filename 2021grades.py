@@ -1,4 +1,5 @@
 from admissions.grades import *
+from admissions.countries import resolve_countries
 
 # scrape website
 scrapegradedata()
@@ -26,7 +27,7 @@ countries[names == "University of Waterloo"] = 'Canada'
 countries[countries == 'Scotland'] = 'United Kingdom'
 names[names == 'DEFAULT Great Britain'] = 'DEFAULT United Kingdom'
 names[names == 'National Institute of Technology'] = 'National Institute of Technology, Tiruchirappalli'
-countries = np.array(cc.convert(names = list(countries), to = 'name_short'))
+countries = np.array(resolve_countries(list(countries)))
 
 # remove any entries without data (and the redundant default Scotland)
 # also remove the 'before' entries'
@@ -54,7 +55,7 @@ for d in dups:
 #first, clean up all the defaults 'DEFAULTS'
 defaults = np.array(['DEFAULT' in n for n in names])
 names[names == 'DEFAULT Argetina'] = 'Argentina'
-names[defaults] = np.array(['DEFAULT '+c for c in cc.convert(names = list(names[defaults]), to = 'name_short')])
+names[defaults] = np.array(['DEFAULT '+c for c in resolve_countries(list(names[defaults]))])
 
 #load known aliases and apply
 tmp = pandas.ExcelFile('grades_aliases.xlsx',engine='openpyxl')
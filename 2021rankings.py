@@ -1,6 +1,8 @@
 #%pylab --no-import-all
 from admissions.rankings import *
 import pandas
+from scipy.optimize import curve_fit
+import matplotlib.pyplot as plt
 from fuzzywuzzy import fuzz, process
 
 # Here we are going to create our university lookup list
@@ -0,0 +1,577 @@
+import builtins
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas
+from admissions.tables import writeExcel
+
+# synthetic reference data
+countries = [
+    "United States",
+    "China",
+    "India",
+    "Japan",
+    "Germany",
+    "France",
+    "Canada",
+    "Brazil",
+    "Turkey",
+    "Mexico",
+]
+syllables = ["ka", "lo", "mi", "ra", "ten", "shi", "vo", "ber", "lin", "dor"]
+syllables += ["an", "el", "tor", "gu", "pe", "sa", "nor", "wes", "ton", "ham"]
+schoolforms = [
+    "University of {}",
+    "{} University",
+    "{} Institute of Technology",
+    "{} State University",
+    "{} Polytechnic University",
+]
+
+# application export columns (see utils.readData)
+appcols = [
+    "Last Name",
+    "First Name",
+    "Tags",
+    "Field Admission Decision",
+    "Application Status",
+    "Concentration 1",
+    "Concentration 2",
+    "Verbal GRE (Unofficial)",
+    "Quantitative GRE (Unofficial)",
+    "GRE Analytical Writing GRE (Unofficial)",
+]
+for j in range(1, 4):
+    appcols += [
+        "School Name {}".format(j),
+        "School Country {}".format(j),
+        "School City {}".format(j),
+        "GPA School {}".format(j),
+        "GPA Scale School {}".format(j),
+        "Degree level School {}".format(j),
+        "Earned a degree? School {}".format(j),
+    ]
+concentrations = ["Optics", "Fluids", "Controls", "Space", "Materials", "Undecided"]
+
+# default benchmark sizes (number of applicants)
+sizes = [100, 1000, 10000, 50000]
+
+
+def _noinput(prompt=""):
+    raise RuntimeError("Benchmark reached an interactive prompt: {}".format(prompt))
+
+
+class Fixture:
+    """Synthetic reference workbooks and applicant data in a temporary directory
+
+    nschools (int) - number of schools in the lookup table
+    seed (int) - random seed (all inputs are reproducible)
+    """
+
+    def __init__(self, nschools=2000, seed=0):
+        self.dir = tempfile.mkdtemp(prefix="admissions_bench_")
+        self.rng = np.random.default_rng(seed)
+
+        names = set()
+        while len(names) < nschools:
+            names.add(self.rng.choice(schoolforms).format(self.word()))
+        names = sorted(names)
+        self.lookup = pandas.DataFrame(
+            {
+                "Name": names,
+                "Rank": self.rng.integers(1, 400, nschools),
+                "Country": self.rng.choice(countries, nschools),
+            }
+        )
+
+        inds = self.rng.choice(nschools, nschools // 10, replace=False)
+        self.aliases = pandas.DataFrame(
+            {
+                "Alias": [
+                    "".join([w[0] for w in names[k].split()]) + " {}".format(k)
+                    for k in inds
+                ],
+                "Standard Name": [names[k] for k in inds],
+            }
+        )
+        ignore = pandas.DataFrame(
+            {
+                "Name": ["{} Language School".format(self.word()) for _ in range(20)],
+                "Country": self.rng.choice(countries, 20),
+            }
+        )
+
+        grades = []
+        for country in countries[1:]:
+            grades.append(
+                ["DEFAULT {}".format(country), country, 10, "10/8/6", "4/3.3/2.5"]
+            )
+            grades.append(
+                ["DEFAULT {}".format(country), country, 100, "100/85/60", "4/3.3/2"]
+            )
+        for k in self.rng.choice(nschools, nschools // 20, replace=False):
+            if self.lookup["Country"].values[k] != countries[0]:
+                grades.append(
+                    [
+                        names[k],
+                        self.lookup["Country"].values[k],
+                        100,
+                        "100/90/70",
+                        "4/3.7/2",
+                    ]
+                )
+        grades = pandas.DataFrame(
+            grades, columns=["Name", "Country", "GPAScale", "SchoolGPA", "4ptGPA"]
+        )
+
+        self.rankfile = os.path.join(self.dir, "university_rankings.xlsx")
+        self.aliasfile = os.path.join(self.dir, "university_aliases.xlsx")
+        self.gradefile = os.path.join(self.dir, "grade_data.xlsx")
+        self.utilfile = os.path.join(self.dir, "util.xlsx")
+        writeExcel(self.rankfile, {"lookup": self.lookup})
+        writeExcel(self.aliasfile, {"aliases": self.aliases, "ignore": ignore})
+        writeExcel(self.gradefile, {"grades": grades})
+        writeExcel(
+            self.utilfile,
+            {
+                "rename": pandas.DataFrame(columns=["Full_Name", "Field", "Value"]),
+                "schools": pandas.DataFrame(
+                    columns=["Full_Name", "UG_School", "GR_School"]
+                ),
+            },
+        )
+
+        # country name resolution is cached, and not what we're timing
+        from admissions.countries import resolve_countries
+
+        resolve_countries(countries)
+
+    def close(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def word(self):
+        return "".join(self.rng.choice(syllables, 3)).capitalize()
+
+    def variant(self, name):
+        """Misspelled version of a school name"""
+
+        if "University" in name and self.rng.random() < 0.5:
+            return name.replace("University", "Univ.")
+        k = self.rng.integers(1, len(name) - 1)
+        return name[:k] + name[k + 1 :]
+
+    def queries(self, kind, n):
+        """n (name, country, city) triples resolving by kind (exact, alias, fuzzy)"""
+
+        if kind == "alias":
+            inds = self.rng.integers(0, len(self.aliases), n)
+            tmp = self.lookup.set_index("Name")["Country"]
+            return [
+                (
+                    self.aliases["Alias"].values[k],
+                    tmp[self.aliases["Standard Name"].values[k]],
+                    None,
+                )
+                for k in inds
+            ]
+
+        inds = self.rng.integers(0, len(self.lookup), n)
+        out = []
+        for k in inds:
+            name = self.lookup["Name"].values[k]
+            if kind == "fuzzy":
+                name = self.variant(name)
+            out.append((name, self.lookup["Country"].values[k], None))
+        return out
+
+    def school(self):
+        """One applicant school: 70% exact, 20% alias, 10% misspelled"""
+
+        kind = self.rng.choice(["exact", "alias", "fuzzy"], p=[0.7, 0.2, 0.1])
+        name, country, _ = self.queries(kind, 1)[0]
+        if country == countries[0]:
+            scale = float(self.rng.choice([4.0, 4.3]))
+        else:
+            scale = float(self.rng.choice([10.0, 100.0]))
+        gpa = np.round(scale * self.rng.uniform(0.6, 1.0), 2)
+        return [name, country, self.word(), gpa, scale]
+
+    def applicants(self, n):
+        """Raw application export rows (DataFrame with appcols)"""
+
+        rows = []
+        for k in range(n):
+            row = ["{}{}".format(self.word(), k), self.word(), "", ""]
+            row += ["Submitted"] + list(self.rng.choice(concentrations, 2))
+            row += [
+                int(self.rng.integers(140, 171)),
+                int(self.rng.integers(140, 171)),
+                float(self.rng.integers(2, 7)) / 2 + 2,
+            ]
+            row += self.school() + ["Undergraduate", "Yes"]
+            if self.rng.random() < 0.5:
+                row += self.school() + ["Masters", "Yes"]
+            else:
+                row += [None] * 7
+            row += [None] * 7
+            rows.append(row)
+
+        return pandas.DataFrame(rows, columns=appcols)
+
+    def export(self, n):
+        """Write an n applicant export csv (with its second header row)"""
+
+        fname = os.path.join(self.dir, "apps_{}.csv".format(n))
+        apps = self.applicants(n)
+        with open(fname, "w") as f:
+            f.write(",".join(['"{}"'.format(c) for c in appcols]) + "\n")
+            f.write(",".join(["desc"] * len(appcols)) + "\n")
+            apps.to_csv(f, header=False, index=False)
+
+        return fname
+
+    def utils(self):
+        from admissions.utils import utils
+
+        return utils(
+            self.utilfile,
+            rankfile=self.rankfile,
+            aliasfile=self.aliasfile,
+            gradefile=self.gradefile,
+            batch=True,
+            snapdir=os.path.join(self.dir, ".snapshots"),
+            decisionfile=os.path.join(self.dir, "decisions.json"),
+            datacachedir=os.path.join(self.dir, ".datacache"),
+        )
+
+
+def _writepdf(fname, text):
+    # minimal single page pdf with one line of text
+    stream = "BT /F1 12 Tf 72 720 Td ({}) Tj ET".format(text)
+    objs = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        "/Resources << /Font << /F1 5 0 R >> >> >>",
+        "<< /Length {} >>\nstream\n{}\nendstream".format(len(stream), stream),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = "%PDF-1.4\n"
+    offsets = []
+    for j, obj in enumerate(objs):
+        offsets.append(len(out))
+        out += "{} 0 obj\n{}\nendobj\n".format(j + 1, obj)
+    xref = len(out)
+    out += "xref\n0 {}\n0000000000 65535 f \n".format(len(objs) + 1)
+    out += "".join(["{:010d} 00000 n \n".format(o) for o in offsets])
+    out += "trailer\n<< /Size {} /Root 1 0 R >>\nstartxref\n{}\n%%EOF\n".format(
+        len(objs) + 1, xref
+    )
+    with open(fname, "w") as f:
+        f.write(out)
+
+
+# each benchmark is setup(fixture, size) -> callable to time
+def bench_readData(fx, n):
+    u = fx.utils()
+    fname = fx.export(n)
+    return lambda: u.readData(fname, cache=False)
+
+
+def bench_readData_cached(fx, n):
+    u = fx.utils()
+    fname = fx.export(n)
+    u.readData(fname)
+    return lambda: u.readData(fname)
+
+
+def _bench_matchschool(kind):
+    def bench(fx, n):
+        u = fx.utils()
+        queries = fx.queries(kind, n)
+        return lambda: [u.matchschool(*q) for q in queries]
+
+    return bench
+
+
+def bench_calc4ptGPA(fx, n):
+    u = fx.utils()
+    args = []
+    for _ in range(n):
+        name, country, _, gpa, scale = fx.school()
+        args.append((u.index.official(name) or name, country, scale, gpa))
+    return lambda: [u.calc4ptGPA(*a) for a in args]
+
+
+def bench_fillSchoolData(fx, n):
+    u = fx.utils()
+    data = u.readData(fx.export(n))
+    hasgr = data["School_Name_2"].notnull().values
+    for name, gr in zip(data["Full_Name"].values, hasgr):
+        u.tables["schools"].put(
+            {"Full_Name": name, "UG_School": 1, "GR_School": 2 if gr else np.nan}
+        )
+    return lambda: u.fillSchoolData(data.copy())
+
+
+def bench_genReadingAssignments(fx, n):
+    from admissions.reading import genReadingAssignments
+
+    # ~10 candidates per reader (2 reads each): genReadingAssignmentsHelper's
+    # random shuffling rarely succeeds for much larger loads, and
+    # genReadingAssignments retries until it does
+    readers = np.array(["Reader {}".format(k) for k in range(max(4, n // 5))])
+    candidates = np.array(["Candidate {}".format(k) for k in range(n)])
+    outfile = os.path.join(fx.dir, "assignments.xlsx")
+    return lambda: genReadingAssignments((readers, candidates), outfile)
+
+
+def bench_genReadingAssignmentsConcs(fx, n):
+    from admissions.reading import genReadingAssignmentsConcs
+
+    import ortools  # noqa: F401 (fail in setup, not while timing)
+
+    readers = pandas.DataFrame(
+        fx.rng.integers(0, 3, (10, len(concentrations))),
+        index=["Reader {}".format(k) for k in range(10)],
+        columns=concentrations,
+    )
+    data = pandas.DataFrame(
+        {
+            "Full_Name": ["Candidate {}".format(k) for k in range(n)],
+            "Concentration_1": fx.rng.choice(concentrations, n),
+            "Concentration_2": fx.rng.choice(concentrations, n),
+        }
+    )
+    return lambda: genReadingAssignmentsConcs(readers, data)
+
+
+def bench_scrapePDFs(fx, n):
+    from admissions.scrapePDFs import scrapePDFs
+
+    import pdfminer  # noqa: F401 (fail in setup, not while timing)
+
+    profs = ["{}".format(fx.word()) for _ in range(30)]
+    pdfdir = os.path.join(fx.dir, "pdfs_{}".format(n))
+    os.makedirs(os.path.join(pdfdir, "Candidates"), exist_ok=True)
+    for k in range(n):
+        _writepdf(
+            os.path.join(pdfdir, "Candidates", "app_{}.pdf".format(k)),
+            "I would like to work with {}".format(fx.rng.choice(profs)),
+        )
+    ids = list(range(n))
+    facconsulted = np.array(fx.rng.choice(profs + [np.nan], n), dtype=object)
+
+    def run():
+        cwd = os.getcwd()
+        os.chdir(pdfdir)
+        try:
+            return scrapePDFs(ids, profs, facconsulted)
+        finally:
+            os.chdir(cwd)
+
+    return run
+
+
+def bench_parseusnwr(fx, n):
+    from admissions.rankings import parseusnwr
+
+    lines = []
+    for k in range(n):
+        lines += ["View all 5 photos", "", "{} University".format(fx.word())]
+        lines += ["City, ST", "", "#{}".format(k + 1), "Tuition"]
+        lines += ["REPUTATION SCORE", "", "{:.1f}".format(fx.rng.uniform(1, 5))]
+        lines += ["Save to My Schools"]
+    return lambda: parseusnwr(list(lines))
+
+
+def bench_parseqs(fx, n):
+    from admissions.rankings import parseqs
+
+    lines = []
+    for k in range(n):
+        lines += ["={}".format(k + 1)]
+        lines += [
+            "{} University Logo More\t{}".format(fx.word(), fx.rng.choice(countries))
+        ]
+    return lambda: parseqs(list(lines))
+
+
+def bench_parsethe(fx, n):
+    from admissions.rankings import parsethe
+
+    lines = []
+    for k in range(n):
+        lines += ["{}\t{} University".format(k + 1, fx.word())]
+        lines += [fx.rng.choice(countries), "Explore"]
+    return lambda: parsethe(list(lines))
+
+
+# name -> (setup, largest size to run it at)
+benchmarks = {
+    "readData": (bench_readData, None),
+    "readData_cached": (bench_readData_cached, None),
+    "matchschool_exact": (_bench_matchschool("exact"), None),
+    "matchschool_alias": (_bench_matchschool("alias"), None),
+    "matchschool_fuzzy": (_bench_matchschool("fuzzy"), 10000),
+    "calc4ptGPA": (bench_calc4ptGPA, None),
+    "fillSchoolData": (bench_fillSchoolData, None),
+    # validation is quadratic in the number of candidates
+    "genReadingAssignments": (bench_genReadingAssignments, 10000),
+    # the CP-SAT model is dense in readers x candidates
+    "genReadingAssignmentsConcs": (bench_genReadingAssignmentsConcs, 1000),
+    "scrapePDFs": (bench_scrapePDFs, 10000),
+    "parseusnwr": (bench_parseusnwr, None),
+    "parseqs": (bench_parseqs, None),
+    "parsethe": (bench_parsethe, None),
+}
+
+
+def run(names=None, sizes=sizes, repeat=3, verbose=True):
+    """Run benchmarks
+
+    names - benchmarks to run (defaults to all of them)
+    sizes - numbers of applicants (or entries) to run each benchmark at
+    repeat - max number of timed runs per benchmark (best one is kept);
+        runs slower than one second are not repeated
+
+    Returns a dict of benchmark name -> str(size) -> result dict with
+    time (s) and rate (entries/s), or skipped (reason).
+    """
+
+    if names is None:
+        names = list(benchmarks)
+
+    fx = Fixture()
+    out = {}
+    realinput = builtins.input
+    builtins.input = _noinput
+    try:
+        for name in names:
+            setup, maxsize = benchmarks[name]
+            out[name] = {}
+            for n in sizes:
+                if (maxsize is not None) and (n > maxsize):
+                    res = {"skipped": "larger than {}".format(maxsize)}
+                else:
+                    res = timeit(setup, fx, n, repeat)
+                out[name][str(n)] = res
+                if verbose:
+                    print(formatresult(name, n, res), flush=True)
+    finally:
+        builtins.input = realinput
+        fx.close()
+
+    return out
+
+
+def timeit(setup, fx, n, repeat):
+    """Best of (up to) repeat runs of one benchmark at one size"""
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            func = setup(fx, n)
+        except ImportError as e:
+            return {"skipped": str(e)}
+
+        times = []
+        while len(times) < repeat:
+            t0 = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - t0)
+            if times[-1] > 1:
+                break
+
+    best = min(times)
+    return {"time": best, "rate": n / best}
+
+
+def formatresult(name, n, res):
+    if "skipped" in res:
+        return "{:28s} {:>6d}  skipped ({})".format(name, n, res["skipped"])
+    out = "{:28s} {:>6d}  {:10.4f} s  {:12.1f} /s".format(
+        name, n, res["time"], res["rate"]
+    )
+    return out
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Benchmarks that got slower than baseline by more than tolerance
+
+    results, baseline - outputs of run
+    tolerance - allowed fractional slowdown
+
+    Returns a list of (name, size, time, baseline time) tuples.
+    """
+
+    out = []
+    for name, res in results.items():
+        for n, r in res.items():
+            base = baseline.get(name, {}).get(n, {})
+            if ("time" not in r) or ("time" not in base):
+                continue
+            if r["time"] > base["time"] * (1 + tolerance):
+                out.append((name, int(n), r["time"], base["time"]))
+
+    return out
+
+
+def meta():
+    """Description of the machine and library versions results came from"""
+
+    import scipy
+
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "scipy": scipy.__version__,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Time the applicant-processing hot paths on synthetic data."
+    )
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default all)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=sizes)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--list", action="store_true", help="list benchmarks")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(benchmarks))
+        sys.exit(0)
+
+    results = run(args.names or None, sizes=args.sizes, repeat=args.repeat)
+    with open(args.out, "w") as f:
+        json.dump({"meta": meta(), "results": results}, f, indent=1)
+    print("Results written to {}.".format(args.out))
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        slower = compare(results, baseline, tolerance=args.tolerance)
+        for name, n, t, bt in slower:
+            print(
+                "REGRESSION {} at {}: {:.4f} s vs {:.4f} s baseline".format(
+                    name, n, t, bt
+                )
+            )
+        if slower:
+            sys.exit(1)
+        print("No regressions against {}.".format(args.baseline))
@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+from functools import lru_cache
+from admissions.tables import atomicwrite
+
+# country_converter short names we'd rather not use
+overrides = {"Türkiye": "Turkey"}
+
+# persistent raw name -> country_converter short name cache
+cachefile = os.environ.get(
+    "ADMISSIONS_COUNTRY_CACHE",
+    os.path.join(os.path.expanduser("~"), ".admissions_countries.json"),
+)
+
+_cc = None
+_cache = None
+# guards _cc, _cache and the cache file (the prefetch thread resolves
+# countries too)
+_lock = threading.RLock()
+
+
+def _loadcache():
+    global _cache
+
+    if _cache is None:
+        try:
+            with open(cachefile, "r") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+
+    return _cache
+
+
+def _savecache():
+    # concurrent runs must never see a partial cache
+    try:
+        with atomicwrite(cachefile) as f:
+            json.dump(_cache, f, ensure_ascii=False, indent=0)
+    except OSError:
+        pass
+
+
+def resolve_countries(cnames):
+    """Canonical short names for a list of country name strings
+
+    Only names never seen before are passed on to country_converter (in a
+    single call), and those results are added to the persistent cache.
+    """
+
+    cnames = [str(c) for c in cnames]
+    with _lock:
+        cache = _loadcache()
+        misses = list(set(cnames) - set(cache))
+        if misses:
+            global _cc
+            if _cc is None:
+                # loading the classification table is slow, so only do it
+                # once there's actually something to convert
+                import country_converter as coco
+
+                _cc = coco.CountryConverter()
+            res = _cc.convert(names=misses, to="name_short")
+            if isinstance(res, str):
+                res = [res]
+            cache.update(zip(misses, res))
+            _savecache()
+
+        out = [cache[c] for c in cnames]
+    return [overrides.get(c, c) for c in out]
+
+
+@lru_cache(maxsize=4096)
+def resolve_country(cname):
+    """Canonical short name for a single country name string"""
+
+    return resolve_countries([cname])[0]
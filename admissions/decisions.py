@@ -0,0 +1,123 @@
+import getpass
+import json
+import os
+import time
+from admissions.schoolindex import normalizename
+from admissions.tables import atomicwrite
+
+# persistent (name, country, city) -> operator decision cache, shared by all
+# admissions cycles
+cachefile = os.environ.get(
+    "ADMISSIONS_DECISION_CACHE",
+    os.path.join(os.path.expanduser("~"), ".admissions_decisions.json"),
+)
+
+
+def _whoami():
+    try:
+        return getpass.getuser()
+    except Exception:  # noqa
+        return "unknown"
+
+
+class DecisionCache:
+    """Operator school matching decisions, remembered across cycles
+
+    fname (str) - JSON file holding the cache (created on first save)
+    ttl (float) - decisions older than this many days are ignored (None for
+        no expiry)
+
+    Decisions are keyed on the normalized raw name, country and city, and
+    store the resolution (official school name, skip, or rename), who made
+    it, when, and a stamp of the reference schools in that country at the
+    time.  A decision whose stamp no longer matches (because schools were
+    added to or removed from the rankings for that country) is stale.
+    """
+
+    def __init__(self, fname=None, ttl=None):
+        if fname is None:
+            fname = cachefile
+        self.fname = fname
+        self.ttl = ttl
+        self.changed = False
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+        try:
+            with open(fname, "r") as f:
+                self.decisions = json.load(f)
+        except (OSError, ValueError):
+            self.decisions = {}
+
+    def __len__(self):
+        return len(self.decisions)
+
+    @staticmethod
+    def key(name, country, city=None):
+        if (city is None) or (city != city):
+            city = ""
+        return "\t".join(
+            [normalizename(name), normalizename(country), normalizename(city)]
+        )
+
+    def get(self, name, country, city=None, stamp=None, count=True):
+        """Earlier decision for this school (as matchschool returns it), or None
+
+        count (bool) - include this lookup in the hit/miss/stale counts
+        """
+
+        entry = self.decisions.get(self.key(name, country, city))
+        if entry is None:
+            self.misses += count
+            return None
+
+        if (entry["stamp"] != stamp) or (
+            (self.ttl is not None) and (time.time() - entry["time"] > self.ttl * 86400)
+        ):
+            self.stale += count
+            return None
+
+        self.hits += count
+        res = entry["resolution"]
+        if isinstance(res, list):
+            res = tuple(res)
+        return res
+
+    def put(self, name, country, city, resolution, stamp=None, who=None):
+        """Record a decision (resolution as returned by matchschool)"""
+
+        if who is None:
+            who = _whoami()
+        if isinstance(resolution, tuple):
+            resolution = list(resolution)
+        self.decisions[self.key(name, country, city)] = {
+            "name": name,
+            "country": country,
+            "city": city if city == city else None,
+            "resolution": resolution,
+            "who": who,
+            "time": time.time(),
+            "stamp": stamp,
+        }
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        try:
+            with atomicwrite(self.fname) as f:
+                json.dump(self.decisions, f, ensure_ascii=False, indent=0)
+            self.changed = False
+        except OSError:
+            pass
+
+    def report(self):
+        """One line summary of cache use in this run"""
+
+        n = self.hits + self.misses + self.stale
+        return (
+            "Decision cache: {} hits, {} misses, {} stale ({:.0f}% hit rate).".format(
+                self.hits, self.misses, self.stale, 100 * self.hits / n if n else 0
+            )
+        )
@@ -0,0 +1,373 @@
+import hashlib
+import json
+import sys
+import threading
+import numpy as np
+import pandas
+from admissions.grades import GPAConverter
+from admissions.schoolindex import normalizename
+from admissions.tables import atomicwrite
+
+# hash tables in a snapshot (see FrozenReference)
+tablenames = ["schools", "names", "aliases", "ignore", "countries", "ranks", "grades"]
+
+_attachlock = threading.Lock()
+
+
+def _hash(key):
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(), "little"
+    )
+
+
+def _scalekey(gpascale):
+    return repr(float(gpascale))
+
+
+class _Builder:
+    """Interned string pool plus hash tables, packed into arrays"""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+        self.tables = {t: [] for t in tablenames}
+
+    def intern(self, s):
+        s = str(s)
+        if s not in self.ids:
+            self.ids[s] = len(self.strings)
+            self.strings.append(s)
+        return self.ids[s]
+
+    def add(self, table, key, value):
+        self.tables[table].append((_hash(key), self.intern(key), value))
+
+    def arrays(self):
+        out = {}
+        for table, entries in self.tables.items():
+            entries.sort(key=lambda e: e[0])
+            out[table + "_hash"] = np.array([e[0] for e in entries], dtype=np.uint64)
+            out[table + "_key"] = np.array([e[1] for e in entries], dtype=np.int32)
+            dtype = float if table == "ranks" else np.int32
+            out[table + "_value"] = np.array([e[2] for e in entries], dtype=dtype)
+
+        encoded = [s.encode() for s in self.strings]
+        out["pool"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        out["pooloffsets"] = np.cumsum([0] + [len(s) for s in encoded], dtype=np.int64)
+
+        return out
+
+
+def _pack(arrays):
+    """Header length, JSON header (name -> dtype, shape, offset) and layout size"""
+
+    # arrays start 8 byte aligned after the header, whose length depends on
+    # the offsets in it
+    start = 8
+    while True:
+        layout = {}
+        offset = start
+        for name, arr in arrays.items():
+            layout[name] = [arr.dtype.str, list(arr.shape), offset]
+            offset += -(-arr.nbytes // 8) * 8
+        header = json.dumps(layout).encode()
+        if 8 + len(header) <= start:
+            return header.ljust(start - 8), offset
+        start = 8 + -(-len(header) // 8) * 8
+
+
+def _unpack(buf):
+    """dict of name -> read-only array view into buf"""
+
+    buf = np.frombuffer(buf, dtype=np.uint8)
+    n = int(buf[:8].view(np.int64)[0])
+    layout = json.loads(bytes(buf[8 : 8 + n]))
+    out = {}
+    for name, (dtype, shape, offset) in layout.items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        arr = buf[offset : offset + count * dtype.itemsize].view(dtype).reshape(shape)
+        arr.flags.writeable = False
+        out[name] = arr
+
+    return out
+
+
+class FrozenReference:
+    """Read-only, array-backed snapshot of the reference tables
+
+    arrays - dict of name -> numpy array (see build, attach and load)
+
+    Holds everything matching and GPA conversion need, without any Python
+    dicts: all strings are interned in one UTF-8 pool, the lookup table's
+    countries are integer codes, ranks, aliases, ignores and exact lookups
+    are sorted hash tables (searched with np.searchsorted), and the grade
+    tables are the packed GPAConverter breakpoint arrays.  Lookups take the
+    same arguments as SchoolIndex (and convert those of GPAConverter), so a
+    snapshot can stand in for either in read-only code.
+
+    A snapshot is a single flat buffer, so it can be published into
+    multiprocessing.shared_memory (publish/attach) or written to a file and
+    memory-mapped (save/load).  Either way, readers work on the shared
+    buffer directly; nothing is copied or parsed beyond a small header.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.shm = None
+        self._mmap = None
+        # decoded strings, per process
+        self._strings = {}
+
+        self.grades = FrozenGrades(self)
+
+    @classmethod
+    def build(cls, index, gpaconv, lookup):
+        """Snapshot of current reference structures
+
+        index - SchoolIndex
+        gpaconv - GPAConverter
+        lookup - DataFrame with Name and Country columns (the lookup sheet)
+        """
+
+        b = _Builder()
+        for (namekey, countrykey), name in index.schools.items():
+            b.add("schools", namekey + "\t" + countrykey, b.intern(name))
+        for namekey, name in index.names.items():
+            b.add("names", namekey, b.intern(name))
+        for key, standard_name in index.aliases.items():
+            b.add("aliases", key, b.intern(standard_name))
+        for namekey, countrykey in index.ignore:
+            b.add("ignore", namekey + "\t" + countrykey, -1)
+        for key, n in index.countries.items():
+            b.add("countries", key, n)
+        for name, rank in index.ranks.items():
+            b.add("ranks", str(name), rank)
+
+        # exact (name, country, scale) tables, then DEFAULT <country> ones
+        for (name, country, gpascale), ind in gpaconv.keys.items():
+            b.add("grades", "\t".join([name, country, _scalekey(gpascale)]), ind)
+        for (name, gpascale), ind in gpaconv.defaults.items():
+            b.add("grades", "\t".join([name, "", _scalekey(gpascale)]), ind)
+
+        # lookup sheet, with countries as codes into countrynames
+        codes, countries = pandas.factorize(lookup["Country"].astype(str))
+        lookupname = [b.intern(n) for n in lookup["Name"].values]
+        countrynames = [b.intern(c) for c in countries]
+
+        arrays = b.arrays()
+        arrays["lookupname"] = np.array(lookupname, dtype=np.int32)
+        arrays["lookupcountry"] = codes.astype(np.int32)
+        arrays["countrynames"] = np.array(countrynames, dtype=np.int32)
+        arrays["xs"] = np.asarray(gpaconv.xs, dtype=float)
+        arrays["ys"] = np.asarray(gpaconv.ys, dtype=float)
+        arrays["offsets"] = np.asarray(gpaconv.offsets, dtype=np.int64)
+
+        return cls(arrays)
+
+    @property
+    def nbytes(self):
+        return _pack(self.arrays)[1]
+
+    def pack(self, buf):
+        """Write the snapshot into buf (a writable buffer of at least nbytes)"""
+
+        header, size = _pack(self.arrays)
+        out = np.frombuffer(buf, dtype=np.uint8, count=size)
+        out[:8] = np.frombuffer(np.int64(len(header)).tobytes(), dtype=np.uint8)
+        out[8 : 8 + len(header)] = np.frombuffer(header, dtype=np.uint8)
+        for name, (dtype, shape, offset) in json.loads(header).items():
+            arr = np.ascontiguousarray(self.arrays[name])
+            out[offset : offset + arr.nbytes] = arr.view(np.uint8).reshape(-1)
+
+    def publish(self, name=None):
+        """Copy into a new shared memory block
+
+        name - block name (random if None)
+
+        Returns the snapshot backed by the block (see attach).  The caller
+        owns the block and should unlink it when all workers are done.
+        """
+
+        from multiprocessing import shared_memory
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=self.nbytes)
+        self.pack(shm.buf)
+        out = FrozenReference(_unpack(shm.buf))
+        out.shm = shm
+
+        return out
+
+    @classmethod
+    def attach(cls, name):
+        """Snapshot in existing shared memory block name (zero copy)"""
+
+        from multiprocessing import shared_memory
+
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # attaching would register the block with this process's resource
+            # tracker, which then unlinks it on exit (or, in workers sharing
+            # the owner's tracker, unregisters it twice)
+            from multiprocessing import resource_tracker
+
+            with _attachlock:
+                register = resource_tracker.register
+                resource_tracker.register = lambda name, rtype: None
+                try:
+                    shm = shared_memory.SharedMemory(name=name)
+                finally:
+                    resource_tracker.register = register
+        out = cls(_unpack(shm.buf))
+        out.shm = shm
+
+        return out
+
+    @property
+    def name(self):
+        """Shared memory block name (None if not in shared memory)"""
+
+        return None if self.shm is None else self.shm.name
+
+    def close(self):
+        """Detach from shared memory (all arrays become unusable)"""
+
+        self.arrays = {}
+        self.grades = None
+        if self.shm is not None:
+            self.shm.close()
+        self._mmap = None
+
+    def unlink(self):
+        """Close and free the shared memory block (owner only)"""
+
+        shm = self.shm
+        self.close()
+        if shm is not None:
+            shm.unlink()
+
+    def save(self, fname):
+        """Write to a file (atomically), for memory-mapping with load"""
+
+        with atomicwrite(fname, "wb") as f:
+            buf = bytearray(self.nbytes)
+            self.pack(buf)
+            f.write(buf)
+
+    @classmethod
+    def load(cls, fname):
+        """Snapshot memory-mapped (read-only) from a file written by save"""
+
+        mm = np.memmap(fname, dtype=np.uint8, mode="r")
+        out = cls(_unpack(mm))
+        out._mmap = mm
+
+        return out
+
+    def string(self, ind):
+        """Interned string ind"""
+
+        s = self._strings.get(ind)
+        if s is None:
+            off = self.arrays["pooloffsets"]
+            s = bytes(self.arrays["pool"][off[ind] : off[ind + 1]]).decode()
+            self._strings[ind] = s
+        return s
+
+    def find(self, table, key):
+        """Position of key in hash table, or None"""
+
+        hashes = self.arrays[table + "_hash"]
+        keys = self.arrays[table + "_key"]
+        h = np.uint64(_hash(key))
+        i = int(np.searchsorted(hashes, h))
+        while (i < len(hashes)) and (hashes[i] == h):
+            if self.string(int(keys[i])) == key:
+                return i
+            i += 1
+        return None
+
+    def value(self, table, key):
+        i = self.find(table, key)
+        if i is None:
+            return None
+        return self.arrays[table + "_value"][i]
+
+    def stringvalue(self, table, key):
+        ind = self.value(table, key)
+        return None if ind is None else self.string(int(ind))
+
+    def isignored(self, name, country):
+        key = normalizename(name) + "\t" + normalizename(country)
+        return self.find("ignore", key) is not None
+
+    def school(self, name, country):
+        """Official name of school in country, or None"""
+        key = normalizename(name) + "\t" + normalizename(country)
+        return self.stringvalue("schools", key)
+
+    def alias(self, name):
+        """Standard name for alias, or None"""
+        return self.stringvalue("aliases", normalizename(name))
+
+    def official(self, name):
+        """Official name of school in any country, or None"""
+        return self.stringvalue("names", normalizename(name))
+
+    def knowncountry(self, country):
+        return self.find("countries", normalizename(country)) is not None
+
+    def isknown(self, name):
+        key = normalizename(name)
+        return (self.find("names", key) is not None) or (
+            self.find("aliases", key) is not None
+        )
+
+    def rank(self, name):
+        rank = self.value("ranks", str(name))
+        return None if rank is None else float(rank)
+
+    def lookup(self):
+        """DataFrame with Name and Country columns (as the lookup sheet)"""
+
+        countries = [self.string(int(i)) for i in self.arrays["countrynames"]]
+        return pandas.DataFrame(
+            {
+                "Name": [self.string(int(i)) for i in self.arrays["lookupname"]],
+                "Country": np.array(countries, dtype=object)[
+                    self.arrays["lookupcountry"]
+                ],
+            }
+        )
+
+    def convert(self, schools, countries, gpascales, gpas):
+        """Convert arrays of GPAs to the 4 point scale (see GPAConverter)"""
+
+        return self.grades.convert(schools, countries, gpascales, gpas)
+
+
+class FrozenGrades(GPAConverter):
+    """GPAConverter over the breakpoint arrays of a FrozenReference"""
+
+    def __init__(self, ref):
+        self.ref = ref
+        self.xs = ref.arrays["xs"]
+        self.ys = ref.arrays["ys"]
+        self.offsets = ref.arrays["offsets"]
+
+    def add(self, *args):
+        raise TypeError("Frozen grade tables are read-only.")
+
+    def table(self, school, country, gpascale):
+        """Index of the table for school/country/scale, or None"""
+
+        if gpascale != gpascale:
+            return None
+        scale = _scalekey(gpascale)
+        ind = self.ref.value("grades", "\t".join([str(school), str(country), scale]))
+        if ind is None:
+            ind = self.ref.value(
+                "grades", "\t".join(["DEFAULT {}".format(country), "", scale])
+            )
+        return None if ind is None else int(ind)
@@ -1,12 +1,11 @@
 import numpy as np
 import pandas
-import scipy.interpolate
-
-import requests
-from html.parser import HTMLParser
 
 
 def scrapegradedata(URL="http://gpa.eng.uci.edu/"):
+    import requests
+    from html.parser import HTMLParser
+
     page = requests.get(URL)
 
     class GradeHTMLParser(HTMLParser):
@@ -71,6 +70,8 @@ def scrapegradedata(URL="http://gpa.eng.uci.edu/"):
 
 def gengradedicts(grade_data="grade_data.xlsx"):
     # generate school and country grade dictionaries
+    import scipy.interpolate
+
     tmp = pandas.ExcelFile(grade_data, engine="openpyxl")
     grades = tmp.parse("grades")
     tmp.close()
@@ -98,3 +99,98 @@ def gengradedicts(grade_data="grade_data.xlsx"):
         )
 
     return countrygrades, schoolgrades
+
+
+class GPAConverter:
+    """Packed piecewise-linear GPA conversion tables
+
+    grades - DataFrame with Name, Country, GPAScale, SchoolGPA and 4ptGPA
+        columns (the last two being /-separated breakpoint lists)
+
+    All breakpoints live in two flat arrays, with each table addressed by
+    its offset.  Tables are found by (Name, Country, GPAScale), falling back
+    to the DEFAULT <Country> entry for the scale.
+    """
+
+    def __init__(self, grades):
+        self.xs = np.zeros(0)
+        self.ys = np.zeros(0)
+        self.offsets = np.zeros(1, dtype=int)
+        self.keys = {}
+        self.defaults = {}
+
+        cols = ["Name", "Country", "GPAScale", "SchoolGPA", "4ptGPA"]
+        for row in grades[cols].values:
+            self.add(*row)
+
+    def add(self, name, country, gpascale, xgpastr, ygpastr):
+        """Add a table (breakpoints given as gpascale/.../min strings)"""
+
+        xgpa = np.array(xgpastr.split("/")).astype(float)
+        ygpa = np.array(ygpastr.split("/")).astype(float)
+        if (xgpa.min() != 0) & (ygpa.min() != 0):
+            xgpa = np.hstack([xgpa, 0])
+            ygpa = np.hstack([ygpa, 0])
+        inds = np.argsort(xgpa)
+
+        ind = len(self.offsets) - 1
+        self.xs = np.hstack([self.xs, xgpa[inds]])
+        self.ys = np.hstack([self.ys, ygpa[inds]])
+        self.offsets = np.hstack([self.offsets, len(self.xs)])
+
+        # first entry wins, as with the original mask lookups
+        self.keys.setdefault((name, country, gpascale), ind)
+        if name.startswith("DEFAULT "):
+            self.defaults.setdefault((name, gpascale), ind)
+
+        return ind
+
+    def table(self, school, country, gpascale):
+        """Index of the table for school/country/scale, or None"""
+
+        ind = self.keys.get((school, country, gpascale))
+        if ind is None:
+            ind = self.defaults.get(("DEFAULT {}".format(country), gpascale))
+        return ind
+
+    def interp(self, ind, gpa):
+        """Evaluate table ind at gpa (scalar or array)
+
+        GPAs outside the table's range come back as NaN.
+        """
+
+        s = slice(self.offsets[ind], self.offsets[ind + 1])
+        xs = self.xs[s]
+        out = np.interp(gpa, xs, self.ys[s])
+        return np.where((gpa < xs[0]) | (gpa > xs[-1]), np.nan, out)[()]
+
+    def convert(self, schools, countries, gpascales, gpas):
+        """Convert arrays of GPAs to the 4 point scale
+
+        Entries with no matching table are returned as NaN.
+        """
+
+        gpascales = np.asarray(gpascales, dtype=float)
+        gpas = np.asarray(gpas, dtype=float)
+        out = np.full(gpas.shape, np.nan)
+
+        # 4 point (and 4.x capped) scales need no table
+        four = gpascales == 4.0
+        out[four] = gpas[four]
+        capped = np.isin(gpascales, [4.3, 4.33, 4.2])
+        out[capped] = np.minimum(gpas[capped], 4.0)
+
+        rest = np.where(~four & ~capped)[0]
+        keys = pandas.DataFrame(
+            {
+                "School": np.asarray(schools, dtype=object)[rest],
+                "Country": np.asarray(countries, dtype=object)[rest],
+                "GPAScale": gpascales[rest],
+            }
+        )
+        for key, inds in keys.groupby(list(keys.columns), sort=False).indices.items():
+            ind = self.table(*key)
+            if ind is not None:
+                out[rest[inds]] = self.interp(ind, gpas[rest[inds]])
+
+        return out
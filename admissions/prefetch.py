@@ -0,0 +1,92 @@
+import threading
+
+
+class Prefetcher(threading.Thread):
+    """Background thread resolving upcoming schools while prompts are open
+
+    u - utils instance
+    rows - list of dicts of School_Name_j, School_Country_j, School_City_j
+        (j = 1-3) for the applicants about to be processed, in order
+    ahead - max number of applicants to run ahead of the consumer
+
+    For each upcoming school, the country is resolved and, if no reference
+    table resolves the name, its best fuzzy match is stored in
+    u.resolutions (where matchschool looks first).  u.reflock is only held
+    to snapshot the reference data each match needs and to store its result;
+    a result is only stored if u.refversion did not change while it was
+    computed, so answers that change the reference tables invalidate
+    everything in flight.  The consumer calls advance(i) when it starts on
+    applicant i.
+    """
+
+    def __init__(self, u, rows, ahead=10):
+        super().__init__(daemon=True)
+        self.u = u
+        self.rows = rows
+        self.ahead = ahead
+        # consumer position and stop flag, guarded by cond
+        self.cond = threading.Condition()
+        self.position = 0
+        self.stopped = False
+
+    def advance(self, position):
+        """Consumer is now at applicant position (lets the thread run on)"""
+
+        with self.cond:
+            self.position = position
+            self.cond.notify_all()
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+
+    def prefetch(self, name, country, city):
+        u = self.u
+        country = u.resolve_country(country)
+        if (city is not None) and (city != city):
+            city = None
+        key = (name, country, city)
+
+        with u.reflock:
+            version = u.refversion
+            if (
+                (key in u.resolutions)
+                or u.index.isignored(name, country)
+                or (u.index.school(name, country) is not None)
+                or (u.index.alias(name) is not None)
+                or not u.index.knowncountry(country)
+            ):
+                return
+            fuzzy = u.fuzzy.snapshot(country)
+
+        # match without holding the lock, so that prompts and updates on the
+        # main thread never wait for it
+        res = fuzzy.best(name, country, city=city)
+        with u.reflock:
+            if u.refversion == version:
+                u.resolutions[key] = res
+
+    def run(self):
+        for i, row in enumerate(self.rows):
+            with self.cond:
+                self.cond.wait_for(
+                    lambda: self.stopped or (i <= self.position + self.ahead)
+                )
+                if self.stopped:
+                    return
+                if i < self.position:
+                    continue
+            for j in range(1, 4):
+                name = row["School_Name_{}".format(j)]
+                if name != name:
+                    continue
+                try:
+                    self.prefetch(
+                        name,
+                        row["School_Country_{}".format(j)],
+                        row["School_City_{}".format(j)],
+                    )
+                except Exception:  # noqa
+                    # the consumer will just compute (and report) this itself
+                    pass
@@ -0,0 +1,83 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from admissions.schoolindex import FuzzyIndex
+
+# per-worker matcher, built once from the lookup passed to the initializer
+_fuzzy = None
+
+
+def _initworker(lookup, shortlist):
+    global _fuzzy
+
+    if isinstance(lookup, str):
+        # name of a published FrozenReference
+        from admissions.frozen import FrozenReference
+
+        ref = FrozenReference.attach(lookup)
+        lookup = ref.lookup()
+        ref.close()
+    _fuzzy = FuzzyIndex(lookup, shortlist=shortlist)
+
+
+def _matchchunk(country, names, cities):
+    return _fuzzy.topk(names, country, cities=cities, k=1)
+
+
+def prematch(index, lookup, triples, workers=None, chunksize=200, shortlist=25):
+    """Fuzzy-match many schools in parallel
+
+    index - SchoolIndex (or FrozenReference) of the current reference tables
+    lookup - DataFrame with Name and Country columns (the lookup sheet), or
+        the name of a published FrozenReference for workers to attach to
+    triples - iterable of (name, country, city) tuples (city may be None)
+    workers - number of worker processes (defaults to the number of CPUs)
+    chunksize - max number of names sent to a worker at once
+
+    Only triples not already resolved by an ignore, exact or alias entry (and
+    in a known country) are scored.  Returns a dict of (name, country, city)
+    -> best (name, score) match.  Each worker builds its own FuzzyIndex once,
+    and names are sent in per-country chunks so that each chunk is scored
+    against a single block.
+    """
+
+    bycountry = {}
+    for name, country, city in set(triples):
+        if (
+            index.isignored(name, country)
+            or (index.school(name, country) is not None)
+            or (index.alias(name) is not None)
+            or not index.knowncountry(country)
+        ):
+            continue
+        bycountry.setdefault(country, []).append((name, city))
+
+    chunks = []
+    for country, todo in bycountry.items():
+        for j in range(0, len(todo), chunksize):
+            names, cities = zip(*todo[j : j + chunksize])
+            chunks.append((country, list(names), list(cities)))
+    if not chunks:
+        return {}
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(chunks))
+
+    if not isinstance(lookup, str):
+        lookup = lookup[["Name", "Country"]]
+    if workers == 1:
+        _initworker(lookup, shortlist)
+        results = [_matchchunk(*chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_initworker, initargs=(lookup, shortlist)
+        ) as ex:
+            results = list(ex.map(_matchchunk, *zip(*chunks)))
+
+    out = {}
+    for (country, names, cities), res in zip(chunks, results):
+        for name, city, best in zip(names, cities, res):
+            if best:
+                out[(name, country, city)] = best[0]
+
+    return out
@@ -1,10 +1,6 @@
 import numpy as np
 import re
-from scipy.optimize import curve_fit
-import country_converter as coco
-import matplotlib.pyplot as plt
-
-cc = coco.CountryConverter()
+from admissions.countries import resolve_countries
 
 
 def parseusnwr(lines, hasreps=True):
@@ -102,6 +98,41 @@ def tfit(x, l, u):
     return np.tanh(x * m + b) * m2 + b2
 
 
+class RankFit:
+    """Median GPA as a function of school rank (see tfit)
+
+    params - tfit (l, u) parameters
+    maxrank - integer ranks up to this are tabulated
+
+    Tabulated ranks are a single array lookup; anything else (fractional or
+    larger ranks) is evaluated directly.  Unranked (NaN) stays NaN.
+    """
+
+    def __init__(self, params, maxrank=200):
+        self.params = [float(p) for p in params]
+        self.table = tfit(np.arange(maxrank + 1), *self.params)
+
+    @classmethod
+    def fit(cls, x, y, p0=(-0.5, 2.5), maxrank=200):
+        """Fit tfit through anchor ranks x and median GPAs y"""
+
+        from scipy.optimize import curve_fit
+
+        params, _ = curve_fit(
+            tfit, np.asarray(x, dtype=float), np.asarray(y, dtype=float), list(p0)
+        )
+        return cls(params, maxrank=maxrank)
+
+    def __call__(self, rank):
+        rank = np.asarray(rank, dtype=float)
+        out = np.full(rank.shape, np.nan)
+        tab = (rank >= 0) & (rank < len(self.table)) & (rank == np.round(rank))
+        out[tab] = self.table[rank[tab].astype(int)]
+        rest = ~tab & ~np.isnan(rank)
+        out[rest] = tfit(rank[rest], *self.params)
+        return out
+
+
 # PCA
 def dopca(x, y):
     R = np.array([x - np.mean(x), y - np.mean(y)])
@@ -120,6 +151,8 @@ def genuslist(
     hbcus="usnwr_hbcus.txt",
 ):
     # Generate list of US schools and ranks
+    from scipy.optimize import curve_fit
+    import matplotlib.pyplot as plt
 
     # engineering undergrad with PhD:
     with open(engugradwphd) as f:
@@ -315,7 +348,7 @@ def parseqs(lines):
         names.append(tmp.groups()[0].strip())
         countries.append(tmp.groups()[1].strip())
 
-    countries = np.array(cc.convert(names=countries, to="name_short"))
+    countries = np.array(resolve_countries(countries))
 
     ranks = np.array(ranks)
     names = np.array(names)
@@ -329,6 +362,8 @@ def genqslist(
     worldu="qs_world_universities.txt",
 ):
     # create merged QS top universities list
+    from scipy.optimize import curve_fit
+    import matplotlib.pyplot as plt
 
     # let's take a look at the top universities engineering & tech degree ranking
     with open(wengtech) as f:
@@ -399,7 +434,7 @@ def parsethe(lines):
 
     wranks = np.array(wranks).astype(float)
     wnames = np.array(wnames)
-    wcountries = np.array(cc.convert(names=wcountries, to="name_short"))
+    wcountries = np.array(resolve_countries(wcountries))
 
     wnames[
         (wnames == "Northeastern University") & (wcountries == "China")
@@ -412,6 +447,8 @@ def genthelist(
     wengtech="the_world_universities_engineering.txt",
     worldu="the_world_universities_all.txt",
 ):
+    from scipy.optimize import curve_fit
+    import matplotlib.pyplot as plt
 
     with open(wengtech) as f:
         lines = f.readlines()
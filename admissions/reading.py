@@ -1,6 +1,4 @@
-import pandas
 import numpy as np
-from cornellGrading import cornellQualtrics
 import os
 
 
@@ -53,6 +51,8 @@ def genReadingAssignmentsHelper(readers, candidates, nreaders):
 
 
 def genReadingAssignments(infile, outfile, nreaders=2):
+    import pandas
+
     # generate reading assignments
     # infile must be xlsx with two sheets (Readers & Canddiates)
 
@@ -98,6 +98,7 @@ def genReadingAssignmentsConcs(readers, data):
     data (pandas dataframe)
     """
 
+    import pandas
     from ortools.sat.python import cp_model
 
     # lets build a reward matrix
@@ -171,6 +172,8 @@ def genRubricSurvey(surveyname, candidates, rubrics, scoreOptions, shareWith=Non
     shareWith (str) optional
     """
 
+    from cornellGrading import cornellQualtrics
+
     # connect and craete survey
     c = cornellQualtrics()
     surveyId = c.createSurvey(surveyname)
@@ -393,6 +396,9 @@ def genRankSurvey(readername, candidates, binsize, surveyBaseName=None, shareWit
     shareWith (str) optional
     surveyBaseName (str) optional
     """
+
+    from cornellGrading import cornellQualtrics
+
     # connect and craete survey
     c = cornellQualtrics()
     surveyname = "Ranking Survey for {}".format(readername)
@@ -460,6 +466,9 @@ def genRankSurvey(readername, candidates, binsize, surveyBaseName=None, shareWit
 
 
 def getRankSurveyRes(assignments, outfile, surveyBaseName=None, c=None):
+    import pandas
+    from cornellGrading import cornellQualtrics
+
     if c is None:
         c = cornellQualtrics()
 
@@ -544,6 +553,8 @@ def genRankDragSurvey(surveyname, candidates, shareWith=None):
     shareWith (str) optional
     """
 
+    from cornellGrading import cornellQualtrics
+
     # connect and craete survey
     c = cornellQualtrics()
     surveyId = c.createSurvey(surveyname)
@@ -583,6 +594,8 @@ def genRankDragSurvey(surveyname, candidates, shareWith=None):
 
 
 def binRubricSurveyResults(surveyname, outfile):
+    import pandas
+    from cornellGrading import cornellQualtrics
 
     c = cornellQualtrics()
     surveyId = c.getSurveyId(surveyname)
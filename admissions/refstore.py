@@ -0,0 +1,178 @@
+import sqlite3
+import pandas
+from admissions.tables import writeExcel
+
+# table (also the sheet name in the xlsx files) -> (columns, indexed columns)
+tables = {
+    "lookup": (["Name", "Rank", "Country"], ["Name", "Country"]),
+    "aliases": (["Alias", "Standard Name"], ["Alias"]),
+    "ignore": (["Name", "Country"], ["Name", "Country"]),
+    "grades": (
+        ["Name", "Country", "GPAScale", "SchoolGPA", "4ptGPA"],
+        ["Name", "Country", "GPAScale"],
+    ),
+    "rename": (["Full_Name", "Field", "Value"], ["Full_Name"]),
+    "schools": (["Full_Name", "UG_School", "GR_School"], ["Full_Name"]),
+}
+
+# workbook (by utils argument name) -> tables stored in it
+workbooks = {
+    "rankfile": ["lookup"],
+    "aliasfile": ["aliases", "ignore"],
+    "gradefile": ["grades"],
+    "utilfile": ["rename", "schools"],
+}
+
+
+def _quote(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def _py(val):
+    # sqlite3 only knows about python scalars
+    if hasattr(val, "item"):
+        val = val.item()
+    if val != val:
+        return None
+    return val
+
+
+class RefStore:
+    """SQLite database holding all reference tables
+
+    dbfile (str) - database file (created if missing)
+
+    Every write is a single transaction.  The xlsx workbooks are only
+    touched by importExcel/exportExcel.
+    """
+
+    def __init__(self, dbfile):
+        self.dbfile = dbfile
+        self.conn = sqlite3.connect(dbfile)
+
+        with self.conn:
+            for table, (cols, inds) in tables.items():
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS {} ({})".format(
+                        _quote(table), ", ".join([_quote(c) for c in cols])
+                    )
+                )
+                self.conn.execute(
+                    "CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+                        _quote("idx_" + table),
+                        _quote(table),
+                        ", ".join([_quote(c) for c in inds]),
+                    )
+                )
+
+    def close(self):
+        self.conn.close()
+
+    def read(self, table):
+        """Full table as a DataFrame, in insertion order"""
+
+        cols = tables[table][0]
+        return pandas.read_sql_query(
+            "SELECT {} FROM {} ORDER BY rowid".format(
+                ", ".join([_quote(c) for c in cols]), _quote(table)
+            ),
+            self.conn,
+        )
+
+    def _insert(self, table, row):
+        cols = tables[table][0]
+        self.conn.execute(
+            "INSERT INTO {} ({}) VALUES ({})".format(
+                _quote(table),
+                ", ".join([_quote(c) for c in cols]),
+                ", ".join(["?"] * len(cols)),
+            ),
+            [_py(row.get(c)) for c in cols],
+        )
+
+    def _delete(self, table, where):
+        self.conn.execute(
+            "DELETE FROM {} WHERE {}".format(
+                _quote(table), " AND ".join([_quote(c) + " = ?" for c in where])
+            ),
+            [_py(v) for v in where.values()],
+        )
+
+    def insert(self, table, row):
+        """Insert one row (dict keyed by column name)"""
+
+        with self.conn:
+            self._insert(table, row)
+
+    def delete(self, table, **where):
+        """Delete all rows matching the given column values"""
+
+        with self.conn:
+            self._delete(table, where)
+
+    def upsert(self, table, row, key):
+        """Replace all rows with the same key column value by row
+
+        The delete and insert happen in a single transaction.
+        """
+
+        with self.conn:
+            self._delete(table, {key: row[key]})
+            self._insert(table, row)
+
+    def replace(self, table, data):
+        """Replace full table contents with DataFrame data"""
+
+        cols = tables[table][0]
+        with self.conn:
+            self.conn.execute("DELETE FROM {}".format(_quote(table)))
+            self.conn.executemany(
+                "INSERT INTO {} ({}) VALUES ({})".format(
+                    _quote(table),
+                    ", ".join([_quote(c) for c in cols]),
+                    ", ".join(["?"] * len(cols)),
+                ),
+                [[_py(v) for v in row] for row in data[cols].values],
+            )
+
+    def importExcel(self, **files):
+        """Load tables from xlsx workbooks
+
+        Keyword arguments are rankfile, aliasfile, gradefile and utilfile
+        (any subset).  All tables in each given workbook are replaced.
+        """
+
+        for key, fname in files.items():
+            tmp = pandas.ExcelFile(fname, engine="openpyxl")
+            for table in workbooks[key]:
+                self.replace(table, tmp.parse(table))
+            tmp.close()
+
+    def exportExcel(self, **files):
+        """Write tables back out to xlsx workbooks (see importExcel)"""
+
+        for key, fname in files.items():
+            writeExcel(fname, {table: self.read(table) for table in workbooks[key]})
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Import/export reference workbooks to/from a SQLite store."
+    )
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("dbfile")
+    parser.add_argument("utilfile")
+    parser.add_argument("--rankfile", default="university_rankings.xlsx")
+    parser.add_argument("--aliasfile", default="university_aliases.xlsx")
+    parser.add_argument("--gradefile", default="grade_data.xlsx")
+    args = parser.parse_args()
+
+    store = RefStore(args.dbfile)
+    files = {key: getattr(args, key) for key in workbooks}
+    if args.command == "import":
+        store.importExcel(**files)
+    else:
+        store.exportExcel(**files)
+    store.close()
@@ -0,0 +1,268 @@
+import hashlib
+import re
+import string
+import unicodedata
+import numpy as np
+
+# punctuation is folded to spaces so that "Univ. of X" and "Univ of X" collide
+_punctrans = str.maketrans(
+    string.punctuation + "’‘“”–—", " " * (len(string.punctuation) + 6)
+)
+_spaces = re.compile(r"\s+")
+
+
+def normalizename(name):
+    """Fold a school (or country) name to a canonical lookup key
+
+    Strips accents, case and punctuation and collapses whitespace.
+    """
+
+    if (name is None) or (name != name):
+        return ""
+    name = unicodedata.normalize("NFKD", str(name))
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    name = name.casefold().translate(_punctrans)
+
+    return _spaces.sub(" ", name).strip()
+
+
+class SchoolIndex:
+    """Hash indices over the lookup, aliases and ignore tables
+
+    lookup - DataFrame with Name, Rank, Country columns
+    aliases - DataFrame with Alias, Standard Name columns
+    ignore - DataFrame with Name, Country columns
+    """
+
+    def __init__(self, lookup, aliases, ignore):
+        # (name key, country key) -> official name
+        self.schools = {}
+        # name key -> official name (any country)
+        self.names = {}
+        # official name -> rank
+        self.ranks = {}
+        # country key -> number of schools we know in that country
+        self.countries = {}
+        # alias key -> standard name
+        self.aliases = {}
+        # set of (name key, country key)
+        self.ignore = set()
+        # country key -> digest of its official school names
+        self.stamps = {}
+
+        for name, rank, country in zip(
+            lookup["Name"].values, lookup["Rank"].values, lookup["Country"].values
+        ):
+            self.addschool(name, rank, country)
+        for alias, standard_name in zip(
+            aliases["Alias"].values, aliases["Standard Name"].values
+        ):
+            self.addalias(alias, standard_name)
+        for name, country in zip(ignore["Name"].values, ignore["Country"].values):
+            self.addignore(name, country)
+
+    def addschool(self, name, rank, country):
+        key = (normalizename(name), normalizename(country))
+        # first entry wins, as with the original .values[0] lookups
+        if key not in self.schools:
+            self.schools[key] = name
+        if key[0] not in self.names:
+            self.names[key[0]] = name
+        # the lookup table is kept sorted by rank, so keep the best one
+        if (name not in self.ranks) or (rank < self.ranks[name]):
+            self.ranks[name] = rank
+        self.countries[key[1]] = self.countries.get(key[1], 0) + 1
+        self.stamps.pop(key[1], None)
+
+    def addalias(self, alias, standard_name):
+        key = normalizename(alias)
+        if key not in self.aliases:
+            self.aliases[key] = standard_name
+
+    def addignore(self, name, country):
+        self.ignore.add((normalizename(name), normalizename(country)))
+
+    def isignored(self, name, country):
+        return (normalizename(name), normalizename(country)) in self.ignore
+
+    def school(self, name, country):
+        """Official name of school in country, or None"""
+        return self.schools.get((normalizename(name), normalizename(country)))
+
+    def alias(self, name):
+        """Standard name for alias, or None"""
+        return self.aliases.get(normalizename(name))
+
+    def official(self, name):
+        """Official name of school in any country, or None"""
+        return self.names.get(normalizename(name))
+
+    def knowncountry(self, country):
+        return normalizename(country) in self.countries
+
+    def isknown(self, name):
+        key = normalizename(name)
+        return (key in self.names) or (key in self.aliases)
+
+    def rank(self, name):
+        return self.ranks.get(name)
+
+    def countrystamp(self, country):
+        """Digest of all official school names in country"""
+
+        key = normalizename(country)
+        if key not in self.stamps:
+            names = sorted(n for (_, c), n in self.schools.items() if c == key)
+            self.stamps[key] = hashlib.sha1("\n".join(names).encode()).hexdigest()[:16]
+        return self.stamps[key]
+
+
+def trigrams(key):
+    """Set of character trigrams of a normalized name (padded at the ends)"""
+    key = "  {} ".format(key)
+    return {key[j : j + 3] for j in range(len(key) - 2)}
+
+
+class FuzzyBlock:
+    """Trigram postings for all schools in one country"""
+
+    def __init__(self):
+        self.names = []
+        self.keys = []
+        self.sizes = []
+        self.postings = {}
+        self.arrays = None
+
+    def add(self, name):
+        key = normalizename(name)
+        grams = trigrams(key)
+        ind = len(self.names)
+        self.names.append(name)
+        self.keys.append(key)
+        self.sizes.append(len(grams))
+        for g in grams:
+            self.postings.setdefault(g, []).append(ind)
+        # numpy views are rebuilt on next query
+        self.arrays = None
+
+    def buildarrays(self):
+        """(trigram -> postings array, sizes array), built once per change"""
+
+        if self.arrays is None:
+            self.arrays = (
+                {g: np.array(p) for g, p in self.postings.items()},
+                np.array(self.sizes, dtype=float),
+            )
+        return self.arrays
+
+    def snapshot(self):
+        """Copy for querying while the original is added to
+
+        The numpy views are shared (add never modifies them), and only the
+        list of names is copied.
+        """
+
+        out = FuzzyBlock()
+        out.arrays = self.buildarrays()
+        out.names = list(self.names)
+        return out
+
+    def shortlist(self, keys, n):
+        """Indices of the n best trigram (Dice) matches for each key
+
+        Returns an array of shape (len(keys), min(n, number of schools)).
+        """
+
+        postings, sizes = self.buildarrays()
+
+        rows = [np.zeros(0, dtype=int)]
+        cols = [np.zeros(0, dtype=int)]
+        qsizes = np.zeros(len(keys))
+        for j, key in enumerate(keys):
+            grams = trigrams(key)
+            qsizes[j] = len(grams)
+            for g in grams:
+                if g in postings:
+                    cols.append(postings[g])
+                    rows.append(np.full(len(postings[g]), j))
+
+        counts = np.zeros((len(keys), len(self.names)))
+        np.add.at(counts, (np.hstack(rows), np.hstack(cols)), 1)
+        dice = 2 * counts / (qsizes[:, None] + sizes[None, :])
+
+        return np.argsort(-dice, axis=1, kind="stable")[:, :n]
+
+
+class FuzzyIndex:
+    """Per-country blocked fuzzy matcher for school names
+
+    lookup - DataFrame with Name and Country columns
+    shortlist - number of trigram candidates per query passed on to the
+        fuzzywuzzy scorer
+    """
+
+    def __init__(self, lookup, shortlist=25):
+        self.shortlist = shortlist
+        self.blocks = {}
+        for name, country in zip(lookup["Name"].values, lookup["Country"].values):
+            self.add(name, country)
+
+    def add(self, name, country):
+        key = normalizename(country)
+        if key not in self.blocks:
+            self.blocks[key] = FuzzyBlock()
+        self.blocks[key].add(name)
+
+    def snapshot(self, country):
+        """FuzzyIndex over a snapshot of the block for country only
+
+        The result can be queried for country without holding any lock that
+        guards add (see FuzzyBlock.snapshot).
+        """
+
+        out = FuzzyIndex.__new__(FuzzyIndex)
+        out.shortlist = self.shortlist
+        out.blocks = {}
+        key = normalizename(country)
+        if key in self.blocks:
+            out.blocks[key] = self.blocks[key].snapshot()
+        return out
+
+    def topk(self, names, country, cities=None, k=5):
+        """Best k candidates in country for each of names
+
+        Returns a list (one entry per name) of lists of (name, score) tuples,
+        highest score first.  Where cities are given, candidates containing
+        the city name win ties.
+        """
+
+        from fuzzywuzzy import process
+
+        block = self.blocks.get(normalizename(country))
+        if block is None:
+            return [[] for _ in names]
+        if cities is None:
+            cities = [None] * len(names)
+
+        keys = [normalizename(n) for n in names]
+        short = block.shortlist(keys, self.shortlist)
+
+        out = []
+        for name, city, inds in zip(names, cities, short):
+            res = process.extract(name, [block.names[j] for j in inds], limit=None)
+            citykey = normalizename(city)
+            if citykey:
+                res.sort(
+                    key=lambda r: (r[1], citykey in normalizename(r[0])), reverse=True
+                )
+            out.append(res[:k])
+
+        return out
+
+    def best(self, name, country, city=None):
+        """Best (name, score) match for name in country, or None"""
+
+        res = self.topk([name], country, cities=[city], k=1)[0]
+        if res:
+            return res[0]
+        return None
@@ -1,14 +1,14 @@
 import io
 import string
-import pdfminer
-from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
-from pdfminer.converter import TextConverter
-from pdfminer.pdfpage import PDFPage
 import glob
 import numpy as np
 
 
 def scrapePDFs(ids, profs, facconsulted):
+    import pdfminer.layout
+    from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+    from pdfminer.converter import TextConverter
+    from pdfminer.pdfpage import PDFPage
 
     # gather PDF files and ensure we have all we need
     files = glob.glob("Candidates/*.pdf")
@@ -0,0 +1,218 @@
+import os
+import secrets
+import sys
+import tempfile
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+# methods of utils served to clients
+methods = [
+    "matchschool",
+    "calc4ptGPA",
+    "isknownschool",
+    "resolve_country",
+    "rank",
+    "convert",
+    "updateAliases",
+    "updateIgnores",
+    "updateRankings",
+    "updateRenames",
+    "updateGrades",
+    "updateSchoolMatches",
+    "dropSchoolMatches",
+    "writeReview",
+    "applyReview",
+    "save",
+]
+
+# file holding the shared secret clients authenticate with
+keyfile = os.environ.get(
+    "ADMISSIONS_SERVICE_KEY",
+    os.path.join(os.path.expanduser("~"), ".admissions_service_key"),
+)
+
+
+def defaultaddress():
+    """Per-user Unix socket (or localhost port, where there are no sockets)"""
+
+    if sys.platform == "win32":
+        return ("localhost", 6061)
+    return os.path.join(tempfile.gettempdir(), "admissions-{}.sock".format(os.getuid()))
+
+
+def authkey():
+    """Shared secret, created (readable only by this user) on first use"""
+
+    if not os.path.exists(keyfile):
+        fd = os.open(keyfile, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    with open(keyfile, "r") as f:
+        return f.read().strip().encode()
+
+
+class MatchServer:
+    """Serve one in-memory utils instance to local clients
+
+    address - Unix socket path or (host, port) (see defaultaddress)
+    All other keyword arguments are passed on to utils (which is always run
+    in batch mode, so open questions are queued for review, never prompted).
+
+    Reference tables, indices and GPA tables are built once.  Requests from
+    all clients are served one at a time, so updates are serialized.
+    """
+
+    def __init__(self, utilfile, address=None, **kwargs):
+        from admissions.utils import utils
+
+        if address is None:
+            address = defaultaddress()
+        self.address = address
+        kwargs["batch"] = True
+        self.utils = utils(utilfile, **kwargs)
+        self.lock = threading.Lock()
+        self.running = False
+
+    def call(self, method, args, kwargs):
+        u = self.utils
+        if method == "rank":
+            return u.index.rank(*args, **kwargs)
+        if method == "convert":
+            return u.gpaconv.convert(*args, **kwargs)
+        return getattr(u, method)(*args, **kwargs)
+
+    def handle(self, conn):
+        with conn:
+            while self.running:
+                try:
+                    method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                if method == "ping":
+                    res = ("ok", "pong")
+                elif method == "shutdown":
+                    conn.send(("ok", None))
+                    self.stop()
+                    return
+                elif method not in methods:
+                    res = ("error", ValueError("Unknown method {}".format(method)))
+                else:
+                    with self.lock:
+                        try:
+                            res = ("ok", self.call(method, args, kwargs))
+                        except Exception as e:
+                            res = ("error", e)
+                conn.send(res)
+
+    def serve(self):
+        """Accept clients until shut down (blocking)"""
+
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+        self.listener = Listener(self.address, authkey=authkey())
+        self.running = True
+        print("Serving on {}.".format(self.address))
+        try:
+            while self.running:
+                try:
+                    conn = self.listener.accept()
+                except (OSError, AuthenticationError):
+                    # a client failed to connect or authenticate
+                    continue
+                if not self.running:
+                    conn.close()
+                    break
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            self.listener.close()
+            with self.lock:
+                self.utils.save()
+
+    def stop(self):
+        self.running = False
+        # wake up the accept loop
+        Client(self.address, authkey=authkey()).close()
+
+
+class MatchClient:
+    """Thin client for a MatchServer
+
+    address - server address (see defaultaddress)
+
+    Served utils methods (see methods) are called as if on a local utils,
+    e.g. client.matchschool(name, country).  rank(name) and
+    convert(schools, countries, gpascales, gpas) map to the server's
+    SchoolIndex.rank and GPAConverter.convert.  Server-side exceptions are
+    re-raised.
+    """
+
+    def __init__(self, address=None):
+        if address is None:
+            address = defaultaddress()
+        self.conn = Client(address, authkey=authkey())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def request(self, method, *args, **kwargs):
+        self.conn.send((method, args, kwargs))
+        status, res = self.conn.recv()
+        if status == "error":
+            raise res
+        return res
+
+    def __getattr__(self, method):
+        if method not in methods:
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.request(method, *args, **kwargs)
+
+    def ping(self):
+        return self.request("ping")
+
+    def shutdown(self):
+        """Stop the server (after it saves all changes)"""
+
+        self.request("shutdown")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Local match service holding the reference tables in memory."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve")
+    serve.add_argument("utilfile")
+    serve.add_argument("--rankfile", default="university_rankings.xlsx")
+    serve.add_argument("--aliasfile", default="university_aliases.xlsx")
+    serve.add_argument("--gradefile", default="grade_data.xlsx")
+    serve.add_argument("--dbfile")
+    sub.add_parser("ping")
+    sub.add_parser("stop")
+    parser.add_argument("--address", help="socket path (default per user)")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        MatchServer(
+            args.utilfile,
+            address=args.address,
+            rankfile=args.rankfile,
+            aliasfile=args.aliasfile,
+            gradefile=args.gradefile,
+            dbfile=args.dbfile,
+        ).serve()
+    else:
+        with MatchClient(args.address) as client:
+            if args.command == "ping":
+                print(client.ping())
+            else:
+                client.shutdown()
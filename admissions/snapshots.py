@@ -0,0 +1,168 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+from admissions.tables import FileLock, atomicwrite
+
+
+class SnapshotManager:
+    """Content-addressed, compressed version history of reference files
+
+    snapdir (str) - directory holding the snapshots (created if missing)
+    maxsnapshots (int) - number of versions kept per file
+
+    Each distinct file content is stored once, gzipped, under its SHA-256
+    hash.  A manifest records the version history of every file.  Files
+    whose size and modification time are unchanged since their last
+    snapshot are not even re-read.
+    """
+
+    def __init__(self, snapdir=".snapshots", maxsnapshots=20):
+        self.snapdir = snapdir
+        self.maxsnapshots = maxsnapshots
+        self.manifestfile = os.path.join(snapdir, "manifest.json")
+        os.makedirs(snapdir, exist_ok=True)
+        self.readManifest()
+
+    def readManifest(self):
+        if os.path.exists(self.manifestfile):
+            with open(self.manifestfile, "r") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {}
+
+    def blob(self, filehash):
+        return os.path.join(self.snapdir, filehash + ".gz")
+
+    def history(self, fname):
+        """List of versions of fname (oldest first)"""
+
+        return self.manifest.get(os.path.abspath(fname), [])
+
+    def snapshot(self, fnames):
+        """Snapshot each file in fnames whose content changed
+
+        Concurrent sessions take turns, each starting from the current
+        manifest on disk.
+        """
+
+        with FileLock(self.manifestfile):
+            self.readManifest()
+            self._snapshot(fnames)
+
+    def _snapshot(self, fnames):
+        changed = False
+        for fname in fnames:
+            key = os.path.abspath(fname)
+            versions = self.manifest.setdefault(key, [])
+            st = os.stat(fname)
+            if (
+                versions
+                and (versions[-1]["size"] == st.st_size)
+                and (versions[-1]["mtime"] == st.st_mtime)
+            ):
+                continue
+
+            sha = hashlib.sha256()
+            with open(fname, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    sha.update(chunk)
+            filehash = sha.hexdigest()
+
+            changed = True
+            if versions and (versions[-1]["hash"] == filehash):
+                # touched but not modified
+                versions[-1]["size"] = st.st_size
+                versions[-1]["mtime"] = st.st_mtime
+                continue
+
+            if not os.path.exists(self.blob(filehash)):
+                with open(fname, "rb") as fin:
+                    with atomicwrite(self.blob(filehash), "wb") as f:
+                        with gzip.open(f, "wb") as fout:
+                            shutil.copyfileobj(fin, fout)
+
+            versions.append(
+                {
+                    "hash": filehash,
+                    "time": time.time(),
+                    "size": st.st_size,
+                    "mtime": st.st_mtime,
+                }
+            )
+            del versions[: -self.maxsnapshots]
+
+        if changed:
+            self.evict()
+            self.writeManifest()
+
+    def evict(self):
+        """Remove blobs no longer referenced by any version"""
+
+        keep = set(
+            v["hash"] + ".gz" for versions in self.manifest.values() for v in versions
+        )
+        for f in os.listdir(self.snapdir):
+            if f.endswith(".gz") and (f not in keep):
+                os.remove(os.path.join(self.snapdir, f))
+
+    def writeManifest(self):
+        with atomicwrite(self.manifestfile) as f:
+            json.dump(self.manifest, f, indent=1)
+
+    def read(self, fname, version=-1):
+        """Contents (bytes) of a version of fname (index into history)"""
+
+        with gzip.open(self.blob(self.history(fname)[version]["hash"]), "rb") as f:
+            return f.read()
+
+    def restore(self, fname, version=-1, dest=None):
+        """Restore a version of fname (to dest, if given, else in place)
+
+        The current contents are snapshotted first, so a restore can itself
+        be undone.
+        """
+
+        if dest is None:
+            dest = fname
+            self.snapshot([fname])
+        with atomicwrite(dest, "wb") as f:
+            f.write(self.read(fname, version))
+
+    def diff(self, fname, old=-2, new=-1):
+        """Rows added and removed between two versions of an xlsx file
+
+        Returns a dict of sheet name -> DataFrame of the differing rows, with
+        a Change column of 'added' or 'removed'.
+        """
+
+        import pandas
+
+        sheets = []
+        for version in [old, new]:
+            tmp = pandas.ExcelFile(io.BytesIO(self.read(fname, version)))
+            sheets.append({s: tmp.parse(s) for s in tmp.sheet_names})
+            tmp.close()
+
+        out = {}
+        for sheet in set(sheets[0]) | set(sheets[1]):
+            if sheet not in sheets[0]:
+                res = sheets[1][sheet].assign(Change="added")
+            elif sheet not in sheets[1]:
+                res = sheets[0][sheet].assign(Change="removed")
+            else:
+                res = sheets[0][sheet].merge(
+                    sheets[1][sheet], how="outer", indicator="Change"
+                )
+                res = res[res["Change"] != "both"].copy()
+                res["Change"] = (
+                    res["Change"]
+                    .astype(str)
+                    .map({"left_only": "removed", "right_only": "added"})
+                )
+            out[sheet] = res.reset_index(drop=True)
+
+        return out
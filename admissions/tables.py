@@ -0,0 +1,328 @@
+import contextlib
+import os
+import tempfile
+import time
+import pandas
+
+
+@contextlib.contextmanager
+def atomicwrite(fname, mode="w"):
+    """Open a temporary file to write fname through (use in a with block)
+
+    fname - file to (over)write
+    mode - file mode ("w" or "wb")
+
+    The temporary file is created in the same directory and renamed over
+    fname when the block exits normally, so readers never see a partial
+    file.  If the block raises, the temporary file is removed and fname is
+    left untouched.
+    """
+
+    fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(fname)))
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmpname, fname)
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+
+
+def writeExcel(fname, sheets):
+    """Atomically write DataFrames to an xlsx workbook
+
+    fname - workbook to (over)write
+    sheets - dict of sheet name -> DataFrame
+
+    The workbook is written through atomicwrite, so an interrupted write
+    never leaves a truncated workbook behind.
+    """
+
+    with atomicwrite(fname, "wb") as f:
+        with pandas.ExcelWriter(f, engine="openpyxl") as ew:
+            for sheet, data in sheets.items():
+                data.to_excel(ew, sheet_name=sheet, index=False)
+
+
+class AppendTable:
+    """DataFrame with amortized row appends
+
+    data - initial DataFrame
+    sortby - optional column (or list of columns) to sort the merged view by
+
+    Appended rows are buffered in a list, and are only concatenated onto the
+    DataFrame (and the result sorted) when the merged view is next asked for.
+    All appends since the last merge are also remembered, so that they can
+    be replayed onto a newer copy of the table (see merge).
+    """
+
+    def __init__(self, data, sortby=None):
+        self.data = data
+        self.columns = list(data.columns)
+        self.sortby = sortby
+        self.pending = []
+        self.added = []
+
+    def __len__(self):
+        return len(self.data) + len(self.pending)
+
+    def append(self, row):
+        """Buffer one row (dict keyed by column name)"""
+
+        self.pending.append(row)
+        self.added.append(row)
+
+    def merge(self, data):
+        """Replace the table with data plus all local changes since last merge
+
+        data - current copy of the table (e.g. as just re-read from disk)
+
+        Rows that are then exact duplicates are dropped.
+        """
+
+        self.data = data.reset_index(drop=True)
+        self.pending = list(self.added)
+        self.added = []
+        merged = self.frame.drop_duplicates()
+        self.data = merged.reset_index(drop=True)
+
+        return self.data
+
+    @property
+    def frame(self):
+        """Merged (and sorted) view of all rows"""
+
+        if self.pending:
+            new = pandas.DataFrame(self.pending, columns=self.columns)
+            if len(self.data):
+                self.data = pandas.concat([self.data, new], ignore_index=True)
+            else:
+                self.data = new
+            self.pending = []
+            if self.sortby is not None:
+                self.data = self.data.sort_values(
+                    by=self.sortby, kind="stable"
+                ).reset_index(drop=True)
+
+        return self.data
+
+
+class KeyedTable:
+    """Table with one row per key, held as a dict
+
+    data - initial DataFrame
+    key - column holding the (unique) row keys
+
+    Rows are dicts keyed by column name.  get/put/delete are O(1); the
+    DataFrame view (sorted by key) is only rebuilt after a change.  If a key
+    repeats in data, its first row wins.
+    """
+
+    def __init__(self, data, key):
+        self.key = key
+        self.columns = list(data.columns)
+        self.load(data)
+
+    def load(self, data):
+        self.rows = {}
+        for row in data.to_dict("records"):
+            self.rows.setdefault(row[self.key], row)
+        self._frame = None
+        # key -> row (or None, if deleted) changed since the last merge
+        self.changed = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def get(self, key, column=None, default=None):
+        """Row for key (or a single column value from it)"""
+
+        row = self.rows.get(key)
+        if row is None:
+            return default
+        if column is None:
+            return row
+        return row.get(column, default)
+
+    def put(self, row):
+        """Insert or replace one row (dict keyed by column name)"""
+
+        self.rows[row[self.key]] = row
+        self.changed[row[self.key]] = row
+        self._frame = None
+
+    def delete(self, key):
+        """Remove the row for key (if any)"""
+
+        if self.rows.pop(key, None) is not None:
+            self._frame = None
+        self.changed[key] = None
+
+    def merge(self, data):
+        """Replace the table with data plus all local changes since last merge
+
+        data - current copy of the table (e.g. as just re-read from disk)
+
+        Local puts and deletes win over whatever data holds for the same keys.
+        """
+
+        changed = self.changed
+        self.load(data)
+        for key, row in changed.items():
+            if row is None:
+                self.rows.pop(key, None)
+            else:
+                self.rows[key] = row
+
+        return self.frame
+
+    @property
+    def frame(self):
+        """DataFrame view of all rows, sorted by key"""
+
+        if self._frame is None:
+            self._frame = pandas.DataFrame(
+                [self.rows[k] for k in sorted(self.rows)], columns=self.columns
+            )
+
+        return self._frame
+
+
+class FileLock:
+    """Exclusive advisory lock on fname + ".lock" (use in a with block)
+
+    fname - file to lock
+    timeout - seconds to wait for the lock before raising TimeoutError (None
+        to wait forever)
+
+    The lock file is removed again on release (except on Windows, where open
+    files can't be removed), so lock files don't pile up next to the files
+    they guard.
+    """
+
+    def __init__(self, fname, timeout=None):
+        self.lockfile = os.path.abspath(fname) + ".lock"
+        self.timeout = timeout
+        self.fd = None
+
+    def _trylock(self):
+        while True:
+            try:
+                if os.name == "nt":
+                    import msvcrt
+
+                    msvcrt.locking(self.fd, msvcrt.LK_NBLCK, 1)
+                    return True
+                else:
+                    import fcntl
+
+                    fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
+
+            # the previous holder may have removed the file after we opened
+            # it, in which case we hold a lock nobody else will see: reopen
+            try:
+                if os.path.samestat(os.stat(self.lockfile), os.fstat(self.fd)):
+                    return True
+            except FileNotFoundError:
+                pass
+            os.close(self.fd)
+            self.fd = os.open(self.lockfile, os.O_RDWR | os.O_CREAT)
+
+    def __enter__(self):
+        self.fd = os.open(self.lockfile, os.O_RDWR | os.O_CREAT)
+        t0 = time.time()
+        while not self._trylock():
+            if (self.timeout is not None) and (time.time() - t0 > self.timeout):
+                os.close(self.fd)
+                raise TimeoutError("Could not lock {}".format(self.lockfile))
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *args):
+        if os.name == "nt":
+            import msvcrt
+
+            msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            # remove while still holding the lock, so that waiters notice
+            try:
+                os.remove(self.lockfile)
+            except FileNotFoundError:
+                pass
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+
+
+class FrameCache:
+    """Directory of cached DataFrames, keyed by content hash
+
+    cachedir - directory holding the cache (created if missing)
+    maxentries - number of most recently used entries kept
+
+    Frames are stored as Feather files (read back memory-mapped) if pyarrow
+    is available, and pickled otherwise.  Frames returned by get are always
+    writable.
+    """
+
+    def __init__(self, cachedir, maxentries=10):
+        self.cachedir = cachedir
+        self.maxentries = maxentries
+        try:
+            import pyarrow.feather  # noqa: F401
+
+            self.ext = ".feather"
+        except ImportError:
+            self.ext = ".pkl"
+
+    def path(self, key):
+        return os.path.join(self.cachedir, key + self.ext)
+
+    def get(self, key):
+        """Cached frame for key, or None"""
+
+        fname = self.path(key)
+        if not os.path.exists(fname):
+            return None
+        try:
+            if self.ext == ".feather":
+                import pyarrow.feather
+
+                # to_pandas may hand out (read-only) views of the mapped
+                # buffers, so copy to get a frame the caller can modify
+                table = pyarrow.feather.read_table(fname, memory_map=True)
+                data = table.to_pandas().copy()
+            else:
+                data = pandas.read_pickle(fname)
+        except Exception:  # noqa
+            # unreadable (e.g. from an incompatible version): just rebuild
+            return None
+        os.utime(fname)
+
+        return data
+
+    def put(self, key, data):
+        os.makedirs(self.cachedir, exist_ok=True)
+        with atomicwrite(self.path(key), "wb") as f:
+            if self.ext == ".feather":
+                data.to_feather(f)
+            else:
+                data.to_pickle(f)
+
+        # evict least recently used entries
+        entries = sorted(
+            [
+                os.path.join(self.cachedir, f)
+                for f in os.listdir(self.cachedir)
+                if f.endswith(self.ext)
+            ],
+            key=os.path.getmtime,
+        )
+        for f in entries[: -self.maxentries]:
+            os.remove(f)
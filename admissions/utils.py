@@ -1,12 +1,232 @@
 import numpy as np
 import pandas
-import scipy.interpolate
-from scipy.optimize import curve_fit
-from scipy.stats import norm
-import country_converter as coco
-from fuzzywuzzy import process
-from shutil import copyfile
-from admissions.rankings import tfit
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import weakref
+from admissions.rankings import RankFit
+from admissions.grades import GPAConverter
+from admissions.countries import resolve_country, resolve_countries
+from admissions.schoolindex import SchoolIndex, FuzzyIndex
+from admissions.refstore import RefStore
+from admissions.prematch import prematch
+from admissions.decisions import DecisionCache
+from admissions.workqueue import defaultowner
+from admissions.prefetch import Prefetcher
+from admissions.tables import (
+    AppendTable,
+    KeyedTable,
+    FileLock,
+    FrameCache,
+    atomicwrite,
+    writeExcel,
+)
+from admissions.snapshots import SnapshotManager
+
+# application export columns we never use
+dropcols = [
+    "Assigned",
+    "In Progress",
+    "Completed",
+    "Tags",
+    "Field Admission Decision",
+    "Admit Term (requested)",
+    "Admit Term (offered)",
+    "Application Date Submitted",
+    "Application Status",
+    "Applicant Decision",
+    "Admit Program (offered)",
+    "Decision Layout",
+]
+
+# alternate column naming
+colrenames = {"Legal Last Name": "Last Name", "Legal First Name": "First Name"}
+
+# spaces become underscores, and some special chars are dropped
+coltrans = str.maketrans({" ": "_", "?": None, "(": None, ")": None, '"': None})
+
+# dtypes of application export columns, by normalized column name
+schema = {
+    "Verbal_GRE_Unofficial": "Float64",
+    "Quantitative_GRE_Unofficial": "Float64",
+    "GRE_Analytical_Writing_GRE_Unofficial": "Float64",
+    "Concentration_1": "category",
+    "Concentration_2": "category",
+}
+for j in range(1, 4):
+    schema["School_Name_{}".format(j)] = "category"
+    schema["School_Country_{}".format(j)] = "category"
+    schema["School_City_{}".format(j)] = "category"
+    schema["Degree_level_School_{}".format(j)] = "category"
+    schema["Earned_a_degree_School_{}".format(j)] = "category"
+    schema["GPA_School_{}".format(j)] = "Float64"
+    schema["GPA_Scale_School_{}".format(j)] = "Float64"
+
+# columns added by readData and filled in by fillSchoolData
+derivedcols = {
+    "UGrad_School": "object",
+    "UGrad_GPA": "Float64",
+    "Grad_School": "object",
+    "Grad_GPA": "Float64",
+    "UGrad_GPA_4pt": "Float64",
+    "Grad_GPA_4pt": "Float64",
+    "UGrad_GPA_Norm": "Float64",
+    "Grad_GPA_Norm": "Float64",
+    "UGrad_Rank": "Float64",
+    "Grad_Rank": "Float64",
+    "Total": "Float64",
+}
+
+
+# input columns that determine an applicant's derived columns
+fingerprintcols = [
+    "{}_{}".format(field, j)
+    for j in range(1, 4)
+    for field in [
+        "School_Name",
+        "School_Country",
+        "School_City",
+        "GPA_School",
+        "GPA_Scale_School",
+        "Degree_level_School",
+        "Earned_a_degree_School",
+    ]
+]
+
+
+def slotvalues(data, field, rows, snums, dtype=object):
+    """Values of field for school number snums (1-3) of applicants rows
+
+    data - main data table
+    field - column name without the _1/_2/_3 suffix
+    rows - positional indices of applicants in data
+    snums - school number for each of rows
+    """
+
+    cols = np.stack(
+        [
+            data["{}_{}".format(field, j)].to_numpy(dtype=dtype, na_value=np.nan)
+            for j in range(1, 4)
+        ],
+        axis=1,
+    )
+    return cols[rows, snums - 1]
+
+
+# default anchor points (ranks, median 4 point GPAs) of the rank fit
+rankanchors = ([9, 50], [3.3, 3.5])
+
+
+def normcdf(x):
+    """Standard normal CDF of an array"""
+
+    from scipy.special import erf
+
+    return 0.5 * (1 + erf(np.asarray(x, dtype=float) / np.sqrt(2)))
+
+
+# long-format school table column -> wide column (without the _1/_2/_3)
+slotfields = {
+    "Name": "School_Name",
+    "Country": "School_Country",
+    "City": "School_City",
+    "Degree": "Degree_level_School",
+    "Earned": "Earned_a_degree_School",
+    "GPA": "GPA_School",
+    "GPAScale": "GPA_Scale_School",
+}
+
+
+def longschools(data):
+    """Long-format table of all applicant schools
+
+    data - main data table
+
+    One row per filled in school slot, with Applicant (index label in data),
+    Full_Name, Slot (1-3) and the slot's fields (see slotfields), ordered by
+    applicant and slot.
+    """
+
+    parts = []
+    for j in range(1, 4):
+        part = pandas.DataFrame(
+            {"Applicant": data.index, "Full_Name": data["Full_Name"].values, "Slot": j}
+        )
+        for col, field in slotfields.items():
+            dtype = float if col in ["GPA", "GPAScale"] else object
+            part[col] = data["{}_{}".format(field, j)].to_numpy(
+                dtype=dtype, na_value=np.nan
+            )
+        parts.append(part)
+
+    out = pandas.concat(parts, ignore_index=True)
+    out = out[out["Name"].notnull()]
+
+    return out.sort_values(["Applicant", "Slot"], kind="stable").reset_index(drop=True)
+
+
+def selectschools(table, applicants=None):
+    """Pick UG and grad school slots from a matched long-format school table
+
+    table - output of utils.matchSchoolTable
+    applicants - applicants to pick for (defaults to all in table)
+
+    Returns a DataFrame indexed by applicant with UG_School and GR_School
+    slots (GR_School NaN for none) and Ambiguous (True where someone has to
+    pick).  The rules are those of assignschools: a single school is the UG
+    school; otherwise the one undergraduate degree is, and the one
+    non-undergraduate (or combined) degree is the grad school.
+    """
+
+    t = table[table["School"].notnull()]
+    deg = t["Degree"].fillna("").astype(str).str.lower()
+    under = deg.str.contains("under").values
+    grad = ((~under) | deg.str.contains("combined").values) & (deg != "").values
+    slots = t["Slot"].values
+
+    if applicants is None:
+        applicants = t["Applicant"].unique()
+    out = pandas.DataFrame(
+        index=pandas.Index(applicants, name="Applicant"),
+        columns=["UG_School", "GR_School"],
+        dtype=float,
+    )
+    g = pandas.DataFrame({"Applicant": t["Applicant"].values, "Slot": slots})
+    n = g.groupby("Applicant").size().reindex(out.index, fill_value=0)
+    nunder = g[under].groupby("Applicant").size().reindex(out.index, fill_value=0)
+    ngrad = g[grad].groupby("Applicant").size().reindex(out.index, fill_value=0)
+    first = g.groupby("Applicant")["Slot"].first().reindex(out.index)
+    ugslot = g[under].groupby("Applicant")["Slot"].first().reindex(out.index)
+    grslot = g[grad].groupby("Applicant")["Slot"].first().reindex(out.index)
+
+    single = (n == 1).values
+    out["UG_School"] = np.where(single, first, ugslot)
+    out["GR_School"] = np.where(single | (ngrad == 0).values, np.nan, grslot)
+    out["Ambiguous"] = ~single & ((nunder != 1).values | (ngrad > 1).values)
+
+    return out
+
+
+def sessionname():
+    """Unique name of a utils session (user@host_pid_random, filename safe)
+
+    The random part keeps a new session from taking the name (and so the
+    log) of a crashed one that happened to have the same pid.
+    """
+
+    name = "{}_{}".format(defaultowner(), uuid.uuid4().hex[:8])
+    return re.sub(r"[^\w@.-]", "_", name)
+
+
+def normcol(col):
+    """Normalized (attribute-safe) name of an application export column"""
+
+    return col.strip().translate(coltrans)
 
 
 class utils:
@@ -16,102 +236,390 @@ class utils:
         rankfile="university_rankings.xlsx",
         aliasfile="university_aliases.xlsx",
         gradefile="grade_data.xlsx",
+        batch=False,
+        dbfile=None,
+        checkpoint=20,
+        checkpointtime=60,
+        snapdir=None,
+        derivedcache=None,
+        decisionfile=None,
+        decisionttl=None,
+        datacachedir=None,
+        prefetch=10,
     ):
+        """
+        utilfile (str) - xlsx file with rename and schools sheets
+        rankfile (str) - xlsx file with lookup sheet
+        aliasfile (str) - xlsx file with aliases and ignore sheets
+        gradefile (str) - xlsx file with grades sheet
+        batch (bool) - never prompt: queue all open questions for review
+            instead (see preflight/applyReview)
+        dbfile (str) - optional SQLite reference store (see refstore).  If
+            set, all tables are read from and written to it, and the xlsx
+            files are only used by importFiles/exportFiles.
+        checkpoint (int) - flush decisions to the checkpoint log after this
+            many of them...
+        checkpointtime (float) - ...or after this many seconds
+        snapdir (str) - where to keep versioned snapshots of the workbooks
+            (see snapshots.SnapshotManager; defaults to .snapshots next to
+            utilfile)
+        derivedcache (str) - pickle of per-applicant fingerprints and
+            derived columns used by refreshSchoolData (defaults to
+            utilfile.derived.pkl)
+        decisionfile (str) - persistent cache of matchschool decisions,
+            shared across cycles (see decisions.DecisionCache; defaults to
+            ~/.admissions_decisions.json)
+        decisionttl (float) - age in days after which cached decisions are
+            no longer used (None for no expiry)
+        datacachedir (str) - where readData keeps cleaned applicant tables
+            (see tables.FrameCache; defaults to .datacache next to utilfile)
+        prefetch (int) - in interactive mode, resolve the schools of up to
+            this many upcoming applicants in the background while prompts
+            are open (see prefetch.Prefetcher; 0 to disable)
+
+        The rank -> median GPA fit is kept in utilfile.rankfit.json, and only
+        refit by setRankFit.
+
+        Changes are written back to the workbooks by save() (or on leaving a
+        with block).  Until then, every decision is also journaled to this
+        session's own utilfile.<session>.log.  Logs left behind by sessions
+        that are no longer running are replayed (and taken over) by the next
+        utils constructed on the same files, so an interrupted session
+        resumes where it stopped.
+        """
 
         self.rankfile = rankfile
         self.aliasfile = aliasfile
         self.gradefile = gradefile
         self.utilfile = utilfile
+        if derivedcache is None:
+            derivedcache = utilfile + ".derived.pkl"
+        self.derivedcache = derivedcache
+        if snapdir is None:
+            snapdir = os.path.join(os.path.dirname(utilfile), ".snapshots")
+        if datacachedir is None:
+            datacachedir = os.path.join(os.path.dirname(utilfile), ".datacache")
+        self.decisions = DecisionCache(decisionfile, ttl=decisionttl)
+        self.datacache = FrameCache(datacachedir)
 
         self.rankup = False
         self.aliasup = False
         self.gradeup = False
         self.utilup = False
 
-        copyfile(rankfile, rankfile + ".bck")
-        copyfile(aliasfile, aliasfile + ".bck")
-        copyfile(gradefile, gradefile + ".bck")
-        copyfile(utilfile, utilfile + ".bck")
+        # deferred questions (batch mode), keyed to avoid duplicates
+        self.batch = batch
+        self.prefetch = prefetch
+
+        # guards the lookup structures against the prefetch thread;
+        # refversion is bumped on every reference table change
+        self.reflock = threading.RLock()
+        self.refversion = 0
+        self.review = {}
+
+        # data from the last readData (see schooltable)
+        self.lastdata = None
+        self._schooltable = None
+
+        # checkpoint journal of decisions not yet saved to the workbooks,
+        # one per session, locked for as long as the session is alive
+        self.logfile = "{}.{}.log".format(utilfile, sessionname())
+        self.loglock = FileLock(self.logfile).__enter__()
+        weakref.finalize(self, self.loglock.__exit__)
+        self.checkpoint = checkpoint
+        self.checkpointtime = checkpointtime
+        self.journal = []
+        self.lastcheckpoint = time.time()
+        self.replaying = False
+        # called on every decision (see log and workQueue)
+        self.heartbeat = None
+
+        if dbfile is None:
+            self.store = None
+            # back up any workbook that changed since the last run
+            self.snapshots = SnapshotManager(snapdir)
+            self.snapshots.snapshot([rankfile, aliasfile, gradefile, utilfile])
+        else:
+            self.store = RefStore(dbfile)
         self.readFiles()
+        self.replayLog()
 
-        # generate grade interpolants
-        tmp = pandas.ExcelFile(self.gradefile, engine="openpyxl")
-        grades = tmp.parse("grades")
-        tmp.close()
+        # rank -> median GPA fit
+        self.rankfitfile = utilfile + ".rankfit.json"
+        self.loadRankFit()
+
+    def loadRankFit(self):
+        """Load the persisted rank fit (fitting the default anchors if needed)"""
+
+        try:
+            with open(self.rankfitfile, "r") as f:
+                fit = json.load(f)
+            self.rankanchors = (fit["x"], fit["y"])
+            self.rankfit = RankFit(fit["params"])
+        except (OSError, ValueError, KeyError):
+            self.setRankFit(*rankanchors)
 
-        interps = []
-        for row in grades.iterrows():
-            xgpa = np.array(row[1]["SchoolGPA"].split("/")).astype(float)
-            ygpa = np.array(row[1]["4ptGPA"].split("/")).astype(float)
-            if (xgpa.min() != 0) & (ygpa.min() != 0):
-                xgpa = np.hstack([xgpa, 0])
-                ygpa = np.hstack([ygpa, 0])
-            interps.append(scipy.interpolate.interp1d(xgpa, ygpa, kind="linear"))
-        grades["Interp"] = interps
-        self.grades = grades
+    def setRankFit(self, x, y):
+        """Refit the rank -> median GPA curve and persist it
 
-        self.cc = coco.CountryConverter()
+        x - anchor ranks
+        y - median 4 point GPAs at those ranks
+        """
+
+        x = [float(v) for v in x]
+        y = [float(v) for v in y]
+        self.rankanchors = (x, y)
+        self.rankfit = RankFit.fit(x, y)
 
-        # create fit function
-        x = np.array([9, 50])
-        y = np.array([3.3, 3.5])
-        ftrank, _ = curve_fit(tfit, x, y, [-0.5, 2.5])
+        try:
+            with atomicwrite(self.rankfitfile) as f:
+                json.dump({"x": x, "y": y, "params": self.rankfit.params}, f)
+        except OSError:
+            pass
 
-        self.rankfit = lambda x: tfit(x, ftrank[0], ftrank[1])
+    def filetimes(self):
+        """Modification times of all reference files"""
+
+        if self.store is not None:
+            fnames = [self.store.dbfile]
+        else:
+            fnames = [self.rankfile, self.aliasfile, self.gradefile, self.utilfile]
+        return [os.stat(f).st_mtime if os.path.exists(f) else None for f in fnames]
 
     def readFiles(self):
-        tmp = pandas.ExcelFile(self.rankfile, engine="openpyxl")
-        self.lookup = tmp.parse("lookup")
-        tmp.close()
-        tmp = pandas.ExcelFile(self.aliasfile, engine="openpyxl")
-        self.aliases = tmp.parse("aliases")
-        self.ignore = tmp.parse("ignore")
-        tmp.close()
-        tmp = pandas.ExcelFile(self.utilfile, engine="openpyxl")
-        self.renames = tmp.parse("rename")
-        self.schoolmatches = tmp.parse("schools")
-        tmp.close()
+        self.mtimes = self.filetimes()
+        if self.store is not None:
+            lookup = self.store.read("lookup")
+            aliases = self.store.read("aliases")
+            ignore = self.store.read("ignore")
+            grades = self.store.read("grades")
+            renames = self.store.read("rename")
+            schoolmatches = self.store.read("schools")
+        else:
+            tmp = pandas.ExcelFile(self.rankfile, engine="openpyxl")
+            lookup = tmp.parse("lookup")
+            tmp.close()
+            tmp = pandas.ExcelFile(self.aliasfile, engine="openpyxl")
+            aliases = tmp.parse("aliases")
+            ignore = tmp.parse("ignore")
+            tmp.close()
+            tmp = pandas.ExcelFile(self.gradefile, engine="openpyxl")
+            grades = tmp.parse("grades")
+            tmp.close()
+            tmp = pandas.ExcelFile(self.utilfile, engine="openpyxl")
+            renames = tmp.parse("rename")
+            schoolmatches = tmp.parse("schools")
+            tmp.close()
+
+        # all edits are buffered; sorting happens only when a table is read
+        self.tables = {
+            "lookup": AppendTable(lookup, sortby="Rank"),
+            "aliases": AppendTable(aliases, sortby="Standard Name"),
+            "ignore": AppendTable(ignore),
+            "grades": AppendTable(grades),
+            "rename": AppendTable(renames),
+            "schools": KeyedTable(schoolmatches, "Full_Name"),
+        }
+
+        self.buildIndices()
+
+    def buildIndices(self):
+        """(Re)build all lookup structures from the current tables"""
+
+        with self.reflock:
+            self.refversion += 1
+
+            # pack grade conversion tables
+            self.gpaconv = GPAConverter(self.grades)
+
+            # hash indices for exact/alias/ignore resolution
+            self.index = SchoolIndex(self.lookup, self.aliases, self.ignore)
+            self.fuzzy = FuzzyIndex(self.lookup)
+
+            # (name, country, city) -> best fuzzy match, filled by prematch
+            # and the prefetch thread
+            self.resolutions = {}
+
+    @property
+    def lookup(self):
+        return self.tables["lookup"].frame
+
+    @property
+    def aliases(self):
+        return self.tables["aliases"].frame
+
+    @property
+    def ignore(self):
+        return self.tables["ignore"].frame
+
+    @property
+    def grades(self):
+        return self.tables["grades"].frame
+
+    @property
+    def renames(self):
+        return self.tables["rename"].frame
+
+    @property
+    def schoolmatches(self):
+        return self.tables["schools"].frame
+
+    @property
+    def schooltable(self):
+        """Long-format school table of the last readData, with match results
+
+        See longschools and matchSchoolTable (matching is lookup-only).  Built
+        on first use, and rebuilt after reference table changes.
+        """
+
+        if self.lastdata is None:
+            return None
+        if (self._schooltable is None) or (self._schooltable[0] != self.refversion):
+            table = self.matchSchoolTable(longschools(self.lastdata), resolve=False)
+            self._schooltable = (self.refversion, table)
 
-    def __del__(self):
-        self.updateFiles()
+        return self._schooltable[1]
 
-    def resolve_country(self, cname):
-        country = self.cc.convert(names=cname, to="name_short")
-        overrides = {"Türkiye": "Turkey"}
-        if country in overrides:
-            country = overrides[country]
+    def __enter__(self):
+        return self
 
-        return country
+    def __exit__(self, *args):
+        # save even when interrupted, so that no decisions are lost
+        self.save()
 
-    def isknownschool(self, name):
-        # try main list
-        if name in self.lookup["Name"].values:
-            return True
-        if name in self.aliases["Alias"].values:
-            return True
+    def log(self, method, *args):
+        """Journal one update, flushing the journal every so often"""
+
+        if self.heartbeat is not None:
+            self.heartbeat()
 
-        return False
+        # the store is transactional already, and replayed entries are
+        # already in the log
+        if (self.store is not None) or self.replaying:
+            return
+
+        self.journal.append([method, args])
+        if (len(self.journal) >= self.checkpoint) or (
+            time.time() - self.lastcheckpoint >= self.checkpointtime
+        ):
+            self.flushLog()
+
+    def flushLog(self):
+        if self.journal:
+            with open(self.logfile, "a") as f:
+                for entry in self.journal:
+                    # numpy scalars -> python scalars
+                    f.write(json.dumps(entry, default=lambda v: v.item()) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        self.journal = []
+        self.lastcheckpoint = time.time()
+
+    def replayLog(self):
+        """Reapply decisions journaled by unsaved earlier sessions
+
+        Only logs not locked by a running session are replayed.  Their
+        entries are moved into this session's log first, so they are saved
+        (or resumed again) along with this session's own decisions.
+        """
+
+        if self.store is not None:
+            return
+
+        for logfile in sorted(glob.glob(glob.escape(self.utilfile) + ".*log")):
+            if logfile == self.logfile:
+                continue
+            try:
+                lock = FileLock(logfile, timeout=0).__enter__()
+            except TimeoutError:
+                # its session is still running
+                continue
+            try:
+                if not os.path.exists(logfile):
+                    # someone else took it over already
+                    continue
+                entries = []
+                with open(logfile, "r") as f:
+                    for line in f:
+                        try:
+                            entries.append(json.loads(line))
+                        except ValueError:
+                            # partial last line from a crash mid-write
+                            break
+                print(
+                    "Resuming {} unsaved decisions from {}.".format(
+                        len(entries), logfile
+                    )
+                )
+
+                self.journal.extend(entries)
+                self.flushLog()
+                os.remove(logfile)
+            finally:
+                lock.__exit__()
+
+            self.replaying = True
+            for method, args in entries:
+                getattr(self, method)(*args)
+            self.replaying = False
+
+    def resolve_country(self, cname):
+        return resolve_country(cname)
+
+    def isknownschool(self, name):
+        return self.index.isknown(name)
 
     def matchschool(self, name, country, city=None):
+        if (city is not None) and (city != city):
+            city = None
+
+        res = self.lookupschool(name, country, city=city, count=True)
+        if res is not None:
+            return res
+
+        res = self.resolveschool(name, country, city=city)
+        if not (isinstance(res, tuple) and (res[0] == "defer")):
+            self.decisions.put(
+                name, country, city, res, stamp=self.index.countrystamp(country)
+            )
+
+        return res
+
+    def lookupschool(self, name, country, city=None, count=False):
+        """matchschool without prompting or deferring (None if unresolved)
+
+        count (bool) - count decision cache hits and misses (only matchschool
+            does, so that lookup-only passes don't skew the report)
+        """
+
+        if (city is not None) and (city != city):
+            city = None
+
         # check ignores first
-        if (name in self.ignore["Name"].values) and (
-            self.ignore.loc[self.ignore.Name == name, "Country"].values[0] == country
-        ):
+        if self.index.isignored(name, country):
             return ("skip",)
 
         # try main list
-        if (name in self.lookup["Name"].values) and (
-            self.lookup.loc[self.lookup.Name == name, "Country"].values[0] == country
-        ):
-            return name
+        res = self.index.school(name, country)
+        if res is not None:
+            return res
 
         # try aliases
-        if name in self.aliases["Alias"].values:
-            return self.aliases.loc[
-                self.aliases["Alias"] == name, "Standard Name"
-            ].values[0]
+        res = self.index.alias(name)
+        if res is not None:
+            return res
+
+        # try earlier decisions (only valid while the schools in this country
+        # are unchanged)
+        stamp = self.index.countrystamp(country)
+        return self.decisions.get(name, country, city=city, stamp=stamp, count=count)
+
+    def resolveschool(self, name, country, city=None):
+        """Resolve a school not in any reference table (see matchschool)"""
 
-        if country not in self.lookup["Country"].values:
+        if not self.index.knowncountry(country):
+            if self.batch:
+                return self.defer("country", Name=name, Country=country, City=city)
             instr = input(
                 "{0}: I don't know any schools in {1}. [new]/[s]kip ".format(
                     name, country
@@ -127,16 +635,20 @@ class utils:
                 newrank = input("Rank: [200] ")
                 if not (newrank):
                     newrank = 200
-                self.updateRankings(newname, newrank, country)
+                self.updateRankings(newname, int(newrank), country)
                 return newname
 
-        # try fuzzy match against main list
-        res = process.extractOne(
-            name, self.lookup.loc[self.lookup["Country"] == country, "Name"].values
-        )
+        # try fuzzy match against main list (pre-matched, if possible)
+        res = self.resolutions.get((name, country, city))
+        if res is None:
+            res = self.fuzzy.best(name, country, city=city)
         if res[1] == 100:
             self.updateAliases(name, res[0])
             return res[0]
+        elif self.batch:
+            return self.defer(
+                "school", Name=name, Country=country, City=city, Suggestion=res[0]
+            )
         else:
             if city:
                 qstr = "I think {} in {}, {} is {}. [accept]/enter alias/[r]ename/[n]ew/[s]kip ".format(
@@ -152,7 +664,7 @@ class utils:
             if instr:
                 if instr == "r":
                     newname = input("Official Name: ")
-                    if newname not in self.lookup["Name"].values:
+                    if self.index.official(newname) is None:
                         print("This is a new school.")
                         newrank = input("Rank: [200] ")
                         if not (newrank):
@@ -174,65 +686,139 @@ class utils:
                     self.updateIgnores(name, country)
                     return ("skip",)
                 else:
-                    if instr not in self.lookup["Name"].values:
+                    official = self.index.official(instr)
+                    if official is None:
                         print(
                             "I don't know the school you just entered.  Trying again."
                         )
                         return self.matchschool(name, country, city=city)
-                    self.updateAliases(name, instr)
-                    return instr
+                    self.updateAliases(name, official)
+                    return official
             else:
                 self.updateAliases(name, res[0])
                 return res[0]
 
     def updateAliases(self, alias, standard_name):
         self.aliasup = True
-        self.aliases = self.aliases.append(
-            pandas.DataFrame({"Alias": [alias], "Standard Name": [standard_name]})
-        )
-        self.aliases = self.aliases.sort_values(by=["Standard Name"]).reset_index(
-            drop=True
-        )
+        row = {"Alias": alias, "Standard Name": standard_name}
+        self.tables["aliases"].append(row)
+        with self.reflock:
+            self.refversion += 1
+            self.index.addalias(alias, standard_name)
+        if self.store is not None:
+            self.store.insert("aliases", row)
+        self.log("updateAliases", alias, standard_name)
 
     def updateIgnores(self, name, country):
         self.aliasup = True
-        self.ignore = self.ignore.append(
-            pandas.DataFrame({"Name": [name], "Country": [country]})
-        ).reset_index(drop=True)
+        row = {"Name": name, "Country": country}
+        self.tables["ignore"].append(row)
+        with self.reflock:
+            self.refversion += 1
+            self.index.addignore(name, country)
+        if self.store is not None:
+            self.store.insert("ignore", row)
+        self.log("updateIgnores", name, country)
 
     def updateRankings(self, name, rank, country):
         self.rankup = True
-        self.lookup = self.lookup.append(
-            pandas.DataFrame({"Name": [name], "Rank": [rank], "Country": [country]})
+        row = {"Name": name, "Rank": rank, "Country": country}
+        self.tables["lookup"].append(row)
+        with self.reflock:
+            self.refversion += 1
+            self.index.addschool(name, rank, country)
+            self.fuzzy.add(name, country)
+            # a new school may be a better fuzzy match than anything
+            # pre-matched
+            self.resolutions = {}
+        if self.store is not None:
+            self.store.insert("lookup", row)
+        self.log("updateRankings", name, rank, country)
+
+    def updateRenames(self, fullname, field, value):
+        self.utilup = True
+        row = {"Full_Name": fullname, "Field": field, "Value": value}
+        self.tables["rename"].append(row)
+        if self.store is not None:
+            self.store.insert("rename", row)
+        self.log("updateRenames", fullname, field, value)
+
+    def updateSchoolMatches(self, fullname, ug, gr=np.nan):
+        """Set UG (and grad) school numbers for an applicant"""
+
+        self.utilup = True
+        row = {"Full_Name": fullname, "UG_School": ug, "GR_School": gr}
+        self.tables["schools"].put(row)
+        if self.store is not None:
+            self.store.upsert("schools", row, "Full_Name")
+        self.log("updateSchoolMatches", fullname, ug, gr)
+
+    def dropSchoolMatches(self, fullname):
+        self.utilup = True
+        self.tables["schools"].delete(fullname)
+        if self.store is not None:
+            self.store.delete("schools", Full_Name=fullname)
+        self.log("dropSchoolMatches", fullname)
+
+    def importFiles(self):
+        """Replace the SQLite store contents with the xlsx workbooks"""
+
+        self.store.importExcel(
+            rankfile=self.rankfile,
+            aliasfile=self.aliasfile,
+            gradefile=self.gradefile,
+            utilfile=self.utilfile,
         )
-        self.lookup = self.lookup.sort_values(by=["Rank"]).reset_index(drop=True)
+        self.readFiles()
 
-    def updateFiles(self):
+    def exportFiles(self):
+        """Write the SQLite store contents out to the xlsx workbooks"""
+
+        self.store.exportExcel(
+            rankfile=self.rankfile,
+            aliasfile=self.aliasfile,
+            gradefile=self.gradefile,
+            utilfile=self.utilfile,
+        )
+
+    def save(self):
+        """Write all changed tables back to their workbooks"""
+
+        # the store is written as we go
+        if self.store is not None:
+            self.rankup = False
+            self.aliasup = False
+            self.gradeup = False
+            self.utilup = False
+
+        # make sure everything is journaled in case a write fails midway
+        self.flushLog()
 
         if self.rankup:
-            with pandas.ExcelWriter(self.rankfile) as ew:
-                self.lookup.to_excel(ew, sheet_name="lookup", index=False)
+            self.mergeWorkbook(self.rankfile, ["lookup"])
 
         if self.aliasup:
-            with pandas.ExcelWriter(self.aliasfile) as ew:
-                self.aliases.to_excel(ew, sheet_name="aliases", index=False)
-                self.ignore.to_excel(ew, sheet_name="ignore", index=False)
+            self.mergeWorkbook(self.aliasfile, ["aliases", "ignore"])
 
         if self.gradeup:
-            grades = self.grades.copy()
-            grades = grades.drop(["Interp"], axis=1)
-            with pandas.ExcelWriter(self.gradefile) as ew:
-                grades.to_excel(ew, sheet_name="grades", index=False)
+            self.mergeWorkbook(self.gradefile, ["grades"])
 
         if self.utilup:
-            renames = self.renames.copy()
-            schoolmatches = self.schoolmatches.copy()
-            schoolmatches = schoolmatches.sort_values(by=["Full_Name"]).reset_index(
-                drop=True
-            )
-            with pandas.ExcelWriter(self.utilfile) as ew:
-                renames.to_excel(ew, sheet_name="rename", index=False)
-                schoolmatches.to_excel(ew, sheet_name="schools", index=False)
+            self.mergeWorkbook(self.utilfile, ["rename", "schools"])
+
+        # pick up everyone else's changes to the reference tables, too
+        if self.rankup or self.aliasup or self.gradeup:
+            self.buildIndices()
+
+        self.mtimes = self.filetimes()
+
+        # everything is on disk now (other sessions' logs are theirs to keep)
+        if os.path.exists(self.logfile):
+            os.remove(self.logfile)
+
+        self.decisions.save()
+        if self.decisions.hits + self.decisions.misses + self.decisions.stale:
+            print(self.decisions.report())
 
         # flush all the update bools
         self.rankup = False
@@ -240,6 +826,106 @@ class utils:
         self.gradeup = False
         self.utilup = False
 
+    def mergeWorkbook(self, fname, sheets):
+        """Merge local changes into the current copy of a workbook on disk
+
+        fname - workbook to update
+        sheets - sheets (= tables) to merge and write
+
+        The workbook is locked while it is re-read, merged and written, so
+        that concurrent sessions on the same files never lose each other's
+        changes.
+        """
+
+        with FileLock(fname):
+            if os.path.exists(fname):
+                tmp = pandas.ExcelFile(fname, engine="openpyxl")
+                for sheet in sheets:
+                    self.tables[sheet].merge(tmp.parse(sheet))
+                tmp.close()
+            writeExcel(fname, {sheet: self.tables[sheet].frame for sheet in sheets})
+
+    def queueApplicants(self, data, queue):
+        """Add all applicants without school matches to a shared work queue
+
+        data - main data table
+        queue - workqueue.WorkQueue
+
+        Returns the number of newly queued applicants.
+        """
+
+        matches = self.tables["schools"]
+        return sum(
+            [
+                queue.add(name, "applicant")
+                for name in data["Full_Name"].values
+                if name not in matches
+            ]
+        )
+
+    def workQueue(self, data, queue, owner=None):
+        """Assign schools for queued applicants until the queue is empty
+
+        data - main data table
+        queue - workqueue.WorkQueue (see queueApplicants)
+        owner - name of this session in the queue (defaults to
+            user@host:pid)
+
+        Applicants are leased one at a time, so concurrent operators never
+        see the same one.  The lease is renewed on every decision, so it only
+        runs out if the operator is idle for longer than queue.lease.  Every assignment is saved right away (merging with
+        everyone else's changes), and reference tables changed by others
+        are re-read before the next applicant.  Applicants left unmatched
+        (all schools skipped, or questions deferred in batch mode) are
+        completed with no result.  Returns the number of applicants
+        completed.
+        """
+
+        if owner is None:
+            owner = defaultowner()
+
+        ndone = 0
+        while True:
+            items = queue.take(owner, kind="applicant")
+            if not items:
+                break
+            key = items[0][0]
+
+            rows = data[data["Full_Name"] == key]
+            if len(rows) == 0:
+                # not in this export; leave it to someone who has it
+                queue.release(key, owner)
+                continue
+
+            def heartbeat(key=key):
+                if not queue.renew(key, owner):
+                    print(
+                        "Lost the lease on {}: someone else may be working on "
+                        "it too.".format(key)
+                    )
+
+            if self.filetimes() != self.mtimes:
+                self.readFiles()
+            self.heartbeat = heartbeat
+            try:
+                self.assignschools(rows)
+                self.save()
+            except BaseException:
+                queue.release(key, owner)
+                raise
+            finally:
+                self.heartbeat = None
+
+            queue.done(key, owner, result=self.tables["schools"].get(key))
+            ndone += 1
+
+        print("Completed {} applicants. Queue: {}".format(ndone, queue.counts()))
+
+        return ndone
+
+    def updateFiles(self):
+        self.save()
+
     def calc4ptGPA(self, school, country, gpascale, gpa):
         """Convert GPA to 4 point scale"""
 
@@ -252,27 +938,16 @@ class utils:
             else:
                 return gpa
 
-        # first try to match the school
-        mtch = (
-            (self.grades.Name == school)
-            & (self.grades.Country == country)
-            & (self.grades.GPAScale == gpascale)
-        )
-        if mtch.any():
-            return self.grades.loc[mtch, "Interp"].values[0](gpa)
-
-        # if that doesn't work, lets try to match the country
-        if (
-            (self.grades["Name"] == "DEFAULT {}".format(country))
-            & (self.grades["GPAScale"] == gpascale)
-        ).any():
-            return self.grades.loc[
-                (self.grades["Name"] == "DEFAULT {}".format(country))
-                & (self.grades["GPAScale"] == gpascale),
-                "Interp",
-            ].values[0](gpa)
+        # try to match the school, and then the country
+        ind = self.gpaconv.table(school, country, gpascale)
+        if ind is not None:
+            return self.gpaconv.interp(ind, gpa)
 
         # if we're here, nothing worked, so lets ask for help
+        if self.batch:
+            self.defer("gpa", Name=school, Country=country, GPAScale=gpascale)
+            return None
+
         print(
             "No matches for {} in {} with {} GPA scale.".format(
                 school, country, gpascale
@@ -287,388 +962,963 @@ class utils:
                 newname = "DEFAULT {}".format(country)
             xgpastr = input("New Entry GPAs: gpascale/.../min ")
             ygpastr = input("New Entry 4pt GPAs: 4.0/.../min ")
-            xgpa = np.array(xgpastr.split("/")).astype(float)
-            ygpa = np.array(ygpastr.split("/")).astype(float)
-            if (xgpa.min() != 0) & (ygpa.min() != 0):
-                xgpa = np.hstack([xgpa, 0])
-                ygpa = np.hstack([ygpa, 0])
-
-            self.grades = self.grades.append(
-                pandas.DataFrame(
-                    {
-                        "Name": [newname],
-                        "Country": [country],
-                        "GPAScale": [gpascale],
-                        "SchoolGPA": [xgpastr],
-                        "4ptGPA": [ygpastr],
-                        "Interp": [
-                            scipy.interpolate.interp1d(xgpa, ygpa, kind="linear")
-                        ],
-                    }
-                ),
-                ignore_index=True,
-            )
-            self.gradeup = True
+            ind = self.updateGrades(newname, country, gpascale, xgpastr, ygpastr)
         else:
             return None
 
-        return self.grades.loc[self.grades.Name == newname, "Interp"].values[0](gpa)
+        return self.gpaconv.interp(ind, gpa)
+
+    def updateGrades(self, name, country, gpascale, xgpastr, ygpastr):
+        self.gradeup = True
+        row = {
+            "Name": name,
+            "Country": country,
+            "GPAScale": gpascale,
+            "SchoolGPA": xgpastr,
+            "4ptGPA": ygpastr,
+        }
+        self.tables["grades"].append(row)
+        if self.store is not None:
+            self.store.insert("grades", row)
+        self.log("updateGrades", name, country, gpascale, xgpastr, ygpastr)
+
+        return self.gpaconv.add(name, country, gpascale, xgpastr, ygpastr)
 
     def assignschools(self, data):
         """Determine undergrad and grad institutions for all students
 
         data - main data table
+
+        In batch mode, this is done for all applicants at once (see
+        assignschoolsTable).
         """
 
-        for row in data.itertuples():
-            fullname = row.Full_Name
-            if fullname in self.schoolmatches["Full_Name"].values:
-                redo = False
-                ugj = self.schoolmatches.loc[
-                    self.schoolmatches["Full_Name"] == fullname, "UG_School"
-                ].values[0]
-                if not (
-                    self.isknownschool(
-                        row.__getattribute__("School_Name_{}".format(int(ugj)))
-                    )
-                ):
-                    redo = True
-
-                gj = self.schoolmatches.loc[
-                    self.schoolmatches["Full_Name"] == fullname, "GR_School"
-                ].values[0]
-                if not (np.isnan(gj)):
-                    if not (
-                        self.isknownschool(
-                            row.__getattribute__("School_Name_{}".format(int(gj)))
-                        )
-                    ):
+        if self.batch:
+            return self.assignschoolsTable(data)
+
+        # resolve upcoming schools while prompts are open
+        prefetcher = None
+        if self.prefetch:
+            cols = [
+                "School_{}_{}".format(field, j)
+                for j in range(1, 4)
+                for field in ["Name", "Country", "City"]
+            ]
+            prefetcher = Prefetcher(
+                self, data[cols].to_dict("records"), ahead=self.prefetch
+            )
+            prefetcher.start()
+
+        slots = longschools(data)
+        records = slots.to_dict("records")
+        byapplicant = slots.groupby("Applicant", sort=False).indices
+
+        matches = self.tables["schools"]
+        try:
+            for i, (ind, fullname) in enumerate(
+                zip(data.index, data["Full_Name"].values)
+            ):
+                if prefetcher is not None:
+                    prefetcher.advance(i)
+                myslots = [records[k] for k in byapplicant.get(ind, [])]
+                names = {r["Slot"]: r["Name"] for r in myslots}
+                if fullname in matches:
+                    redo = False
+                    ugj = matches.get(fullname, "UG_School")
+                    if not (self.isknownschool(names.get(int(ugj)))):
                         redo = True
 
-                if redo:
-                    self.schoolmatches = self.schoolmatches[
-                        self.schoolmatches["Full_Name"] != fullname
-                    ].reset_index(drop=True)
-                else:
-                    continue
+                    gj = matches.get(fullname, "GR_School")
+                    if not (pandas.isnull(gj)):
+                        if not (self.isknownschool(names.get(int(gj)))):
+                            redo = True
 
-            print("\n")
-            print(fullname)
-
-            schools = []
-            degreetypes = []
-            countries = []
-            earneddegs = []
-            gpas = []
-            snums = []
-
-            for j in range(1, 4):
-                s = row.__getattribute__("School_Name_{}".format(j))
-                if s == s:
-                    country = self.resolve_country(
-                        row.__getattribute__("School_Country_{}".format(j))
-                    )
-                    c = row.__getattribute__("School_City_{}".format(j))
-                    res = self.matchschool(s, country, city=c)
+                    if redo:
+                        self.dropSchoolMatches(fullname)
+                    else:
+                        continue
+
+                print("\n")
+                print(fullname)
+
+                deferred = False
+                schools = []
+                degreetypes = []
+                countries = []
+                earneddegs = []
+                gpas = []
+                snums = []
+
+                for r in myslots:
+                    j = r["Slot"]
+                    country = self.resolve_country(r["Country"])
+                    res = self.matchschool(r["Name"], country, city=r["City"])
 
                     if isinstance(res, tuple):
                         if res[0] == "skip":
                             continue
+                        elif res[0] == "defer":
+                            deferred = True
+                            continue
                         elif res[0] == "rename":
-                            self.renames = self.renames.append(
-                                pandas.DataFrame(
-                                    {
-                                        "Full_Name": [fullname],
-                                        "Field": ["School_Name_{}".format(j)],
-                                        "Value": [res[1]],
-                                    }
-                                ),
-                                ignore_index=True,
+                            self.updateRenames(
+                                fullname, "School_Name_{}".format(j), res[1]
                             )
-                            self.utilup = True
                             n = res[1]
                     else:
                         n = res
 
                     schools.append(n)
                     countries.append(country)
-                    tmp = row.__getattribute__("Degree_level_School_{}".format(j))
+                    tmp = r["Degree"]
                     if tmp != tmp:
                         tmp = ""
                     degreetypes.append(tmp)
-                    earneddegs.append(
-                        row.__getattribute__("Earned_a_degree_School_{}".format(j))
-                    )
-                    gpas.append(row.__getattribute__("GPA_School_{}".format(j)))
+                    earneddegs.append(r["Earned"])
+                    gpas.append(r["GPA"])
                     snums.append(j)
 
-            hasgr = False
-            if len(schools) == 1:
-                ug = 0
-                gr = None
-            else:
-                inds = np.where(["under" in d.lower() for d in degreetypes])[0]
-                if len(inds) != 1:
-                    for kk in range(len(schools)):
-                        print(
-                            "{}: {}, {}, Earned: {}, GPA:{}".format(
-                                kk,
-                                schools[kk],
-                                degreetypes[kk],
-                                earneddegs[kk],
-                                gpas[kk],
-                            )
-                        )
-                    waitingForResponse = True
-                    while waitingForResponse:
-                        try:
-                            ug = int(input("Pick UNDERgrad school index (from 0) "))
-                            assert ug in range(len(schools))
-                            waitingForResponse = False
-                        except (ValueError, AssertionError):
-                            print("I need a valid integer from the list.")
+                # can't pick schools until all of them are resolved
+                if deferred:
+                    continue
+
+                hasgr = False
+                if len(schools) == 1:
+                    ug = 0
+                    gr = None
                 else:
-                    ug = inds[0]
-
-                inds = np.where(
-                    [
-                        (("under" not in d.lower()) | ("combined" in d.lower()))
-                        & (d != "")
-                        for d in degreetypes
-                    ]
-                )[0]
-                # throw away any matches of ugrad institution
-                inds[inds != ug]
-                if len(inds) == 0:
-                    pass
-                elif len(inds) > 1:
-                    for kk in range(len(schools)):
-                        print(
-                            "{}: {}, {}, Earned: {}, GPA:{}".format(
-                                kk,
-                                schools[kk],
-                                degreetypes[kk],
-                                earneddegs[kk],
-                                gpas[kk],
+                    inds = np.where(["under" in d.lower() for d in degreetypes])[0]
+                    if len(inds) != 1:
+                        for kk in range(len(schools)):
+                            print(
+                                "{}: {}, {}, Earned: {}, GPA:{}".format(
+                                    kk,
+                                    schools[kk],
+                                    degreetypes[kk],
+                                    earneddegs[kk],
+                                    gpas[kk],
+                                )
                             )
-                        )
-                    gr = input("Pick GRAD school index (from 0) or enter for none ")
-                    if gr:
-                        gr = int(gr)
+                        waitingForResponse = True
+                        while waitingForResponse:
+                            try:
+                                ug = int(input("Pick UNDERgrad school index (from 0) "))
+                                assert ug in range(len(schools))
+                                waitingForResponse = False
+                            except (ValueError, AssertionError):
+                                print("I need a valid integer from the list.")
+                    else:
+                        ug = inds[0]
+
+                    inds = np.where(
+                        [
+                            (("under" not in d.lower()) | ("combined" in d.lower()))
+                            & (d != "")
+                            for d in degreetypes
+                        ]
+                    )[0]
+                    # throw away any matches of ugrad institution
+                    inds[inds != ug]
+                    if len(inds) == 0:
+                        pass
+                    elif len(inds) > 1:
+                        for kk in range(len(schools)):
+                            print(
+                                "{}: {}, {}, Earned: {}, GPA:{}".format(
+                                    kk,
+                                    schools[kk],
+                                    degreetypes[kk],
+                                    earneddegs[kk],
+                                    gpas[kk],
+                                )
+                            )
+                        gr = input("Pick GRAD school index (from 0) or enter for none ")
+                        if gr:
+                            gr = int(gr)
+                            hasgr = True
+                    else:
+                        gr = inds[0]
                         hasgr = True
+
+                if hasgr:
+                    self.updateSchoolMatches(fullname, snums[ug], snums[gr])
                 else:
-                    gr = inds[0]
-                    hasgr = True
-
-            if hasgr:
-                self.schoolmatches = self.schoolmatches.append(
-                    pandas.DataFrame(
-                        {
-                            "Full_Name": [fullname],
-                            "UG_School": [snums[ug]],
-                            "GR_School": [snums[gr]],
-                        }
-                    ),
-                    ignore_index=True,
+                    self.updateSchoolMatches(fullname, snums[ug])
+        finally:
+            if prefetcher is not None:
+                prefetcher.stop()
+
+    def assignschoolsTable(self, data):
+        """Batch mode assignschools, over all applicants at once
+
+        data - main data table
+
+        All schools are matched via matchSchoolTable and UG/grad schools are
+        picked by selectschools.  Applicants with unresolved schools are left
+        for later, and ambiguous picks are queued for review.
+        """
+
+        matches = self.tables["schools"]
+
+        # drop assignments to schools that are no longer known
+        todo = []
+        for ind, fullname in zip(data.index, data["Full_Name"].values):
+            if fullname in matches:
+                redo = False
+                for col in ["UG_School", "GR_School"]:
+                    j = matches.get(fullname, col)
+                    if not pandas.isnull(j):
+                        name = data.at[ind, "School_Name_{}".format(int(j))]
+                        redo |= not self.isknownschool(name)
+                if not redo:
+                    continue
+                self.dropSchoolMatches(fullname)
+            todo.append(ind)
+        if not todo:
+            return
+
+        table = self.matchSchoolTable(longschools(data.loc[todo]))
+        for fullname, j, newname in table.loc[
+            table["Status"] == "rename", ["Full_Name", "Slot", "School"]
+        ].itertuples(index=False):
+            self.updateRenames(fullname, "School_Name_{}".format(j), newname)
+
+        # can't pick schools until all of them are resolved
+        deferred = table.groupby("Applicant")["Status"].agg(
+            lambda s: (s == "defer").any()
+        )
+        table = table[~table["Applicant"].map(deferred)]
+        picks = selectschools(table, applicants=deferred.index[~deferred])
+
+        matched = table[table["School"].notnull()]
+        for ind, ug, gr, ambiguous in picks.itertuples():
+            fullname = data.at[ind, "Full_Name"]
+            if ambiguous:
+                rows = matched[matched["Applicant"] == ind]
+                self.deferschools(
+                    fullname,
+                    list(rows["School"]),
+                    list(rows["Degree"].fillna("")),
+                    list(rows["Earned"]),
+                    list(rows["GPA"]),
+                    list(rows["Slot"]),
                 )
-                self.utilup = True
+            elif gr == gr:
+                self.updateSchoolMatches(fullname, int(ug), int(gr))
             else:
-                self.schoolmatches = self.schoolmatches.append(
-                    pandas.DataFrame(
-                        {
-                            "Full_Name": [fullname],
-                            "UG_School": [snums[ug]],
-                            "GR_School": [np.nan],
-                        }
-                    ),
-                    ignore_index=True,
-                )
-                self.utilup = True
+                self.updateSchoolMatches(fullname, int(ug))
+
+    def matchSchoolTable(self, table, resolve=True):
+        """Match all schools of a long-format school table (see longschools)
+
+        table - output of longschools
+        resolve (bool) - resolve unknown schools via matchschool (prompting or
+            deferring).  If False, only lookupschool is used and unknown
+            schools are left unmatched.
+
+        Returns a copy of table with Country resolved and School (official
+        name, NaN if skipped, deferred or unmatched), Status (matched, skip,
+        defer, rename or unmatched), Rank and GPA_4pt (NaN where no conversion
+        table exists) columns added.  Each unique name/country/city is
+        matched once.
+        """
+
+        match = self.matchschool if resolve else self.lookupschool
+
+        out = table.copy()
+        out["Country"] = resolve_countries(out["Country"].values)
+
+        keys = out[["Name", "Country", "City"]].drop_duplicates()
+        schools = []
+        status = []
+        for name, country, city in keys.itertuples(index=False):
+            res = match(name, country, city=city)
+            if res is None:
+                status.append("unmatched")
+                schools.append(np.nan)
+            elif isinstance(res, tuple):
+                status.append(res[0])
+                schools.append(res[1] if res[0] == "rename" else np.nan)
+            else:
+                status.append("matched")
+                schools.append(res)
+        keys["School"] = schools
+        keys["Status"] = status
+        out = out.merge(keys, on=["Name", "Country", "City"], how="left")
+
+        out["Rank"] = out["School"].map(self.index.ranks).astype(float)
+        out["GPA_4pt"] = self.gpaconv.convert(
+            out["School"].values,
+            out["Country"].values,
+            out["GPAScale"].values,
+            out["GPA"].values,
+        )
+
+        return out
+
+    def schooldata(self, data, rows, snums):
+        """Match schools and convert GPAs for one school slot per applicant
+
+        data - main data table
+        rows - positional indices of applicants in data
+        snums - school number (1-3) to use for each applicant
+
+        Returns a DataFrame aligned with rows, with Name, Country, GPA,
+        GPAScale, School (None if unresolved), GPA_4pt and Converted columns.
+        Each unique school and GPA scale is resolved only once.
+        """
+
+        out = pandas.DataFrame(
+            {
+                "Name": slotvalues(data, "School_Name", rows, snums),
+                "Country": slotvalues(data, "School_Country", rows, snums),
+                "GPA": slotvalues(data, "GPA_School", rows, snums, dtype=float),
+                "GPAScale": slotvalues(
+                    data, "GPA_Scale_School", rows, snums, dtype=float
+                ),
+            }
+        )
+
+        out["Country"] = resolve_countries(out["Country"].values)
+
+        pairs = out[["Name", "Country"]].drop_duplicates()
+        schools = []
+        for name, country in pairs.itertuples(index=False):
+            res = self.matchschool(name, country)
+            if isinstance(res, tuple):
+                res = res[1] if res[0] == "rename" else None
+            schools.append(res)
+        pairs["School"] = schools
+        out = out.merge(pairs, on=["Name", "Country"], how="left")
+
+        gpa4pt = self.gpaconv.convert(
+            out["School"].values,
+            out["Country"].values,
+            out["GPAScale"].values,
+            out["GPA"].values,
+        )
+        converted = ~np.isnan(gpa4pt)
+
+        # anything left either has no table (ask for one) or no GPA
+        rest = np.where(~converted & out["School"].notnull().values)[0]
+        groups = (
+            out.iloc[rest]
+            .groupby(["School", "Country", "GPAScale"], sort=False)
+            .indices
+        )
+        for (school, country, gpascale), inds in groups.items():
+            inds = rest[inds]
+            newgpa = self.calc4ptGPA(school, country, gpascale, out["GPA"].values[inds])
+            if newgpa is not None:
+                gpa4pt[inds] = newgpa
+                converted[inds] = True
+
+        # GPAs outside their table's range need fixing
+        converted[np.isnan(gpa4pt) & ~np.isnan(out["GPA"].values.astype(float))] = False
+        out["GPA_4pt"] = gpa4pt
+        out["Converted"] = converted
+
+        return out
+
+    def renameGPA(self, fullname, j):
+        """Ask for a corrected GPA and scale for school j of an applicant"""
+
+        newgpa = input("GPA: ")
+        newgpascale = input("GPA Scale: ")
+        self.updateRenames(fullname, "GPA_School_{}".format(j), float(newgpa))
+        self.updateRenames(
+            fullname, "GPA_Scale_School_{}".format(j), float(newgpascale)
+        )
 
     def fillSchoolData(self, data):
-        for row in data.itertuples():
-            fullname = row.Full_Name
-            print(fullname)
-
-            # get ugrad gpa
-            j = int(
-                self.schoolmatches.loc[
-                    self.schoolmatches["Full_Name"] == fullname, "UG_School"
-                ].values[0]
-            )
-            s = row.__getattribute__("School_Name_{}".format(j))
-            country = self.resolve_country(
-                row.__getattribute__("School_Country_{}".format(j))
+        """Fill in school, GPA, 4pt GPA, normalized GPA and rank columns
+
+        data - main data table
+
+        Applicants without school matches (or, in batch mode, with questions
+        still under review) are left blank.
+        """
+
+        matches = self.tables["schools"]
+
+        # applicants with failed UGrad conversions don't get grad data either
+        todo = np.ones(len(data), dtype=bool)
+        for level, col in [("UGrad", "UG_School"), ("Grad", "GR_School")]:
+            snums = np.array(
+                [matches.get(n, col, np.nan) for n in data["Full_Name"]],
+                dtype=float,
             )
-            school = self.matchschool(s, country)
-            gpa = row.__getattribute__("GPA_School_{}".format(j))
-            gpascale = row.__getattribute__("GPA_Scale_School_{}".format(j))
-            country = self.resolve_country(
-                row.__getattribute__("School_Country_{}".format(j))
+            rows = np.where(todo & ~np.isnan(snums))[0]
+            snums = snums[rows].astype(int)
+            res = self.schooldata(data, rows, snums)
+
+            matched = res["School"].notnull().values
+            inds = data.index[rows[matched]]
+            data.loc[inds, "{}_School".format(level)] = res["School"].values[matched]
+            data.loc[inds, "{}_GPA".format(level)] = res["GPA"].values[matched]
+
+            # check for rename requests
+            converted = matched & res["Converted"].values
+            for k in np.where(matched & ~converted)[0]:
+                fullname = data["Full_Name"].values[rows[k]]
+                if not self.batch:
+                    self.renameGPA(fullname, snums[k])
+                elif (
+                    self.gpaconv.table(
+                        res["School"].values[k],
+                        res["Country"].values[k],
+                        res["GPAScale"].values[k],
+                    )
+                    is not None
+                ):
+                    self.defer(
+                        "gparange",
+                        Full_Name=fullname,
+                        Name=res["School"].values[k],
+                        Country=res["Country"].values[k],
+                        GPAScale=res["GPAScale"].values[k],
+                        Snums=str(snums[k]),
+                        Options="GPA {} is outside the {} scale".format(
+                            res["GPA"].values[k], res["GPAScale"].values[k]
+                        ),
+                    )
+            todo[rows[~converted]] = False
+
+            inds = data.index[rows[converted]]
+            newgpa = res["GPA_4pt"].values[converted]
+            rank = res["School"][converted].map(self.index.ranks).values.astype(float)
+            medgpa = self.rankfit(rank)
+            data.loc[inds, "{}_GPA_4pt".format(level)] = newgpa
+            data.loc[inds, "{}_Rank".format(level)] = rank
+            data.loc[inds, "{}_GPA_Norm".format(level)] = normcdf(2 * (newgpa - medgpa))
+
+        return data
+
+    def fingerprints(self, data):
+        """Per-applicant hash of all school inputs and school assignments
+
+        Overrides are already applied by readData, so they are covered too.
+        """
+
+        matches = self.tables["schools"]
+        inputs = data[fingerprintcols].copy()
+        for col in ["UG_School", "GR_School"]:
+            inputs[col] = np.array(
+                [matches.get(n, col, np.nan) for n in data["Full_Name"]],
+                dtype=float,
             )
 
-            data.at[row.Index, "UGrad_School"] = school
-            data.at[row.Index, "UGrad_GPA"] = gpa
-            newgpa = self.calc4ptGPA(school, country, gpascale, gpa)
-            # check for rename request:
-            if newgpa is None:
-                newgpa = input("GPA: ")
-                newgpascale = input("GPA Scale: ")
-                self.renames = self.renames.append(
-                    pandas.DataFrame(
-                        {
-                            "Full_Name": [fullname, fullname],
-                            "Field": [
-                                "GPA_School_{}".format(j),
-                                "GPA_Scale_School_{}".format(j),
-                            ],
-                            "Value": [float(newgpa), float(newgpascale)],
-                        }
+        return pandas.util.hash_pandas_object(inputs, index=False).values
+
+    def refstamps(self, data):
+        """Per-applicant digest of the reference data its results depend on
+
+        This covers what the assigned UGrad and Grad schools currently
+        resolve to (so that alias, ignore, country and cached decision
+        changes are seen), and the rank and the grade conversion table of
+        that school (and the rank fit), so that editing any of them
+        invalidates all applicants that used it.
+        """
+
+        matches = self.tables["schools"]
+        stamps = np.full(len(data), "", dtype=object)
+        for level, col in [("UGrad", "UG_School"), ("Grad", "GR_School")]:
+            snums = np.array(
+                [matches.get(n, col, np.nan) for n in data["Full_Name"]],
+                dtype=float,
+            )
+            rows = np.where(~np.isnan(snums))[0]
+            snums = snums[rows].astype(int)
+            keys = pandas.DataFrame(
+                {
+                    "Name": slotvalues(data, "School_Name", rows, snums),
+                    "Country": resolve_countries(
+                        slotvalues(data, "School_Country", rows, snums)
+                    ),
+                    "GPAScale": slotvalues(
+                        data, "GPA_Scale_School", rows, snums, dtype=float
                     ),
-                    ignore_index=True,
+                }
+            )
+
+            groups = keys.groupby(list(keys.columns), sort=False, dropna=False)
+            for (name, country, gpascale), inds in groups.indices.items():
+                # as in schooldata, but without prompting
+                school = self.lookupschool(name, country)
+                if isinstance(school, tuple):
+                    school = school[1] if school[0] == "rename" else None
+                ind = None
+                if school is not None:
+                    ind = self.gpaconv.table(school, country, gpascale)
+                if ind is None:
+                    table = ""
+                else:
+                    s = slice(self.gpaconv.offsets[ind], self.gpaconv.offsets[ind + 1])
+                    table = (self.gpaconv.xs[s].tobytes(), self.gpaconv.ys[s].tobytes())
+                stamp = repr(
+                    (school, self.index.ranks.get(school), table, self.rankfit.params)
                 )
-                self.utilup = True
-                continue
+                stamps[rows[inds]] += hashlib.sha1(stamp.encode()).hexdigest()[:16]
+            stamps[np.setdiff1d(np.arange(len(data)), rows)] += "-"
 
-            data.at[row.Index, "UGrad_GPA_4pt"] = newgpa
+        return stamps
 
-            rank = self.lookup.loc[self.lookup["Name"] == school, "Rank"].values[0]
-            medgpa = self.rankfit(rank)
-            uggpa = norm.cdf(2 * (newgpa - medgpa))
-            data.at[row.Index, "UGrad_Rank"] = rank
-            data.at[row.Index, "UGrad_GPA_Norm"] = uggpa
-
-            # get grad school gpa if it exists
-            if (
-                self.schoolmatches.loc[
-                    self.schoolmatches["Full_Name"] == fullname, "GR_School"
+    def refreshSchoolData(self, data):
+        """Fill in derived school columns, recomputing only what changed
+
+        data - main data table
+
+        Derived columns of applicants whose fingerprint (see fingerprints)
+        and reference digest (see refstamps) match the last run are taken
+        from self.derivedcache.  Everything else goes through
+        fillSchoolData.  Only fully processed applicants are cached.
+        """
+
+        cols = [c for c in derivedcols if c != "Total"]
+
+        self.assignschools(data)
+        fp = self.fingerprints(data)
+
+        if os.path.exists(self.derivedcache):
+            cache = pandas.read_pickle(self.derivedcache)
+            cache = cache[~cache.index.duplicated()].reindex(data["Full_Name"])
+        else:
+            cache = pandas.DataFrame(
+                index=data["Full_Name"], columns=["Fingerprint", "RefStamp"] + cols
+            )
+
+        # restore cached rows first, so that their stamps can be checked
+        hit = (cache["Fingerprint"].values == fp) & cache[
+            "Fingerprint"
+        ].notnull().values
+        inds = data.index[hit]
+        for col in cols:
+            data.loc[inds, col] = cache[col].values[hit]
+        hit[hit] = self.refstamps(data.loc[inds]) == cache["RefStamp"].values[hit]
+
+        stale = data.index[~hit]
+        if len(stale):
+            for col in cols:
+                data.loc[stale, col] = np.nan
+            data.loc[stale] = self.fillSchoolData(data.loc[stale].copy())
+        print("Reused {} applicants, recomputed {}.".format(hit.sum(), len(stale)))
+
+        done = data["UGrad_GPA_Norm"].notnull().values
+        out = data.loc[done, ["Full_Name"] + cols].set_index("Full_Name")
+        out.insert(0, "Fingerprint", fp[done])
+        out.insert(1, "RefStamp", self.refstamps(data[done]))
+        with atomicwrite(self.derivedcache, "wb") as f:
+            out.to_pickle(f)
+
+        return data
+
+    def prematch(self, data, workers=None):
+        """Fuzzy-match all schools in data up front, in parallel
+
+        data - main data table
+        workers - number of worker processes (defaults to the number of CPUs)
+
+        Results land in self.resolutions, which matchschool consults before
+        doing any fuzzy matching of its own.
+        """
+
+        triples = set()
+        for j in range(1, 4):
+            cols = [
+                "School_Name_{}".format(j),
+                "School_Country_{}".format(j),
+                "School_City_{}".format(j),
+            ]
+            slot = data[cols].dropna(subset=[cols[0]]).astype(object)
+            slot = slot.where(slot.notnull(), None)
+            countries = resolve_countries(slot[cols[1]].values)
+            triples.update(zip(slot[cols[0]].values, countries, slot[cols[2]].values))
+
+        if (workers is None) or (workers > 1):
+            # workers attach to one shared snapshot instead of each being
+            # sent (and unpickling) the lookup table
+            snapshot = self.freeze().publish()
+            try:
+                res = prematch(self.index, snapshot.name, triples, workers=workers)
+            finally:
+                snapshot.unlink()
+        else:
+            res = prematch(self.index, self.lookup, triples, workers=workers)
+        self.resolutions.update(res)
+
+    def freeze(self):
+        """Read-only, array-backed snapshot of the reference tables
+
+        Returns a frozen.FrozenReference, to publish into shared memory (or
+        save to a file) for parallel workers to attach to without re-reading
+        any workbooks.
+        """
+
+        from admissions.frozen import FrozenReference
+
+        with self.reflock:
+            return FrozenReference.build(self.index, self.gpaconv, self.lookup)
+
+    def defer(self, qtype, **fields):
+        """Queue a question for later review (batch mode)"""
+
+        fields["Type"] = qtype
+        key = tuple(fields.get(c) for c in ["Type", "Full_Name", "Name", "Country"])
+        key += (fields.get("GPAScale"),)
+        if key not in self.review:
+            self.review[key] = fields
+
+        return ("defer",)
+
+    def deferschools(self, fullname, schools, degreetypes, earneddegs, gpas, snums):
+        options = [
+            "{}: {}, {}, Earned: {}, GPA:{}".format(
+                kk, schools[kk], degreetypes[kk], earneddegs[kk], gpas[kk]
+            )
+            for kk in range(len(schools))
+        ]
+        self.defer(
+            "schools",
+            Full_Name=fullname,
+            Options="; ".join(options),
+            Snums=",".join([str(n) for n in snums]),
+        )
+
+    def preflight(self, data, reviewfile="review.xlsx"):
+        """Resolve everything possible without prompting and queue the rest
+
+        data - main data table
+        reviewfile - xlsx file to write all open questions to
+
+        All unique schools in the table are resolved first, then
+        UG/grad schools are assigned and GPAs converted wherever possible.
+        Every question that would otherwise have been asked interactively
+        is written to reviewfile, to be answered there and then applied in
+        bulk via applyReview.  Returns the (partially) filled data table.
+        """
+
+        batch = self.batch
+        self.batch = True
+        try:
+            self.prematch(data)
+
+            # unique school/country/city triples over all three school slots
+            cols = ["Name", "Country", "City"]
+            slots = pandas.concat(
+                [
+                    data[
+                        [
+                            "School_Name_{}".format(j),
+                            "School_Country_{}".format(j),
+                            "School_City_{}".format(j),
+                        ]
+                    ].set_axis(cols, axis=1)
+                    for j in range(1, 4)
                 ]
-                .notnull()
-                .values[0]
-            ):
-                j = int(
-                    self.schoolmatches.loc[
-                        self.schoolmatches["Full_Name"] == fullname, "GR_School"
-                    ].values[0]
-                )
+            )
+            slots = slots.dropna(subset=["Name"]).drop_duplicates(
+                subset=["Name", "Country"]
+            )
+            slots["Country"] = resolve_countries(slots["Country"].values)
+            for name, country, city in slots[cols].itertuples(index=False):
+                if city != city:
+                    city = None
+                self.matchschool(name, country, city=city)
+
+            self.assignschools(data)
+            data = self.fillSchoolData(data)
+            self.writeReview(reviewfile)
+        finally:
+            self.batch = batch
 
-                s = row.__getattribute__("School_Name_{}".format(j))
-                country = self.resolve_country(
-                    row.__getattribute__("School_Country_{}".format(j))
+        return data
+
+    def writeReview(self, reviewfile="review.xlsx"):
+        """Write all queued questions to reviewfile
+
+        Answer column conventions, by question Type:
+            school - [a]ccept Suggestion, [s]kip, [n]ew school (with Rank),
+                or the official name of the school
+            country - [s]kip or [n]ew school (with Rank)
+            gpa - [d] new DEFAULT country entry or [s] new school entry, with
+                the SchoolGPA (gpascale/.../min) and 4ptGPA (4.0/.../min)
+                columns filled in
+            schools - UNDERgrad option index, optionally followed by a comma
+                and the GRAD option index (e.g. 0,1)
+            gparange - corrected GPA and GPA scale, as gpa/scale (e.g. 8.5/10)
+        Rows left without an answer stay in the queue.
+        """
+
+        cols = [
+            "Type",
+            "Full_Name",
+            "Name",
+            "Country",
+            "City",
+            "GPAScale",
+            "Suggestion",
+            "Options",
+            "Snums",
+            "Answer",
+            "Rank",
+            "SchoolGPA",
+            "4ptGPA",
+        ]
+        review = pandas.DataFrame(list(self.review.values()), columns=cols)
+        writeExcel(reviewfile, {"review": review})
+        print("{} questions written to {}.".format(len(review), reviewfile))
+
+    def applyReview(self, reviewfile="review.xlsx"):
+        """Apply all answered questions in reviewfile (see writeReview)
+
+        Unanswered questions are kept in the review queue.  Returns the
+        number of answers applied.
+        """
+
+        tmp = pandas.ExcelFile(reviewfile, engine="openpyxl")
+        review = tmp.parse(
+            "review",
+            dtype={"Answer": str, "Snums": str, "SchoolGPA": str, "4ptGPA": str},
+        )
+        tmp.close()
+
+        self.review = {}
+        napplied = 0
+        for row in review.to_dict("records"):
+            # drop blank cells so that requeued rows match freshly deferred ones
+            row = {k: v for k, v in row.items() if v == v}
+            qtype = row.pop("Type")
+            ans = row.pop("Answer", "").strip()
+            rank = int(row.pop("Rank", 200))
+
+            if not ans:
+                self.defer(qtype, **row)
+                continue
+
+            if qtype == "school":
+                if ans == "a":
+                    res = row["Suggestion"]
+                    self.updateAliases(row["Name"], res)
+                elif ans == "s":
+                    res = ("skip",)
+                    self.updateIgnores(row["Name"], row["Country"])
+                elif ans == "n":
+                    res = row["Name"]
+                    self.updateRankings(row["Name"], rank, row["Country"])
+                elif self.index.official(ans) is not None:
+                    res = self.index.official(ans)
+                    self.updateAliases(row["Name"], res)
+                else:
+                    print("I don't know {}.  Keeping it for review.".format(ans))
+                    self.defer(qtype, **row)
+                    continue
+            elif qtype == "country":
+                if ans == "n":
+                    res = row["Name"]
+                    self.updateRankings(row["Name"], rank, row["Country"])
+                else:
+                    res = ("skip",)
+                    self.updateIgnores(row["Name"], row["Country"])
+            if qtype in ["school", "country"]:
+                self.decisions.put(
+                    row["Name"],
+                    row["Country"],
+                    row.get("City"),
+                    res,
+                    stamp=self.index.countrystamp(row["Country"]),
                 )
-                school = self.matchschool(s, country)
-                data.at[row.Index, "Grad_School"] = school
-                gpa = row.__getattribute__("GPA_School_{}".format(j))
-                gpascale = row.__getattribute__("GPA_Scale_School_{}".format(j))
-                country = self.resolve_country(
-                    row.__getattribute__("School_Country_{}".format(j))
+            elif qtype == "gpa":
+                if ("SchoolGPA" not in row) or ("4ptGPA" not in row):
+                    print(
+                        "No SchoolGPA/4ptGPA breakpoints for {} in {}.  "
+                        "Keeping it for review.".format(row["Name"], row["Country"])
+                    )
+                    self.defer(qtype, **row)
+                    continue
+                if ans == "d":
+                    newname = "DEFAULT {}".format(row["Country"])
+                else:
+                    newname = row["Name"]
+                self.updateGrades(
+                    newname,
+                    row["Country"],
+                    row["GPAScale"],
+                    row["SchoolGPA"],
+                    row["4ptGPA"],
                 )
-
-                data.at[row.Index, "Grad_GPA"] = gpa
-                newgpa = self.calc4ptGPA(school, country, gpascale, gpa)
-                # check for rename request:
-                if newgpa is None:
-                    newgpa = input("GPA: ")
-                    newgpascale = input("GPA Scale: ")
-                    self.renames = self.renames.append(
-                        pandas.DataFrame(
-                            {
-                                "Full_Name": [fullname, fullname],
-                                "Field": [
-                                    "GPA_School_{}".format(j),
-                                    "GPA_Scale_School_{}".format(j),
-                                ],
-                                "Value": [float(newgpa), float(newgpascale)],
-                            }
-                        ),
-                        ignore_index=True,
+            elif qtype == "gparange":
+                try:
+                    gpa, gpascale = [float(v) for v in ans.split("/")]
+                except ValueError:
+                    print(
+                        "Can't read {} as gpa/scale for {}.  "
+                        "Keeping it for review.".format(ans, row["Full_Name"])
                     )
-                    self.utilup = True
+                    self.defer(qtype, **row)
                     continue
+                j = int(row["Snums"])
+                self.updateRenames(row["Full_Name"], "GPA_School_{}".format(j), gpa)
+                self.updateRenames(
+                    row["Full_Name"], "GPA_Scale_School_{}".format(j), gpascale
+                )
+            elif qtype == "schools":
+                snums = [int(n) for n in row["Snums"].split(",")]
+                picks = [int(n) for n in ans.split(",")]
+                if len(picks) > 1:
+                    self.updateSchoolMatches(
+                        row["Full_Name"], snums[picks[0]], snums[picks[1]]
+                    )
+                else:
+                    self.updateSchoolMatches(row["Full_Name"], snums[picks[0]])
+            napplied += 1
+
+        self.writeReview(reviewfile)
+
+        return napplied
+
+    def readData(self, fname, cache=True):
+        """Read and clean an application export (see schema)
+
+        fname - csv export with two header rows
+        cache (bool) - reuse the cleaned table from the last read of the
+            same export with the same overrides (see dataKey)
 
-                data.at[row.Index, "Grad_GPA_4pt"] = newgpa
+        The matching long-format school table (one row per applicant school)
+        is available as self.schooltable.
+        """
 
-                rank = self.lookup.loc[self.lookup["Name"] == school, "Rank"].values[0]
-                medgpa = self.rankfit(rank)
-                grgpa = norm.cdf(2 * (newgpa - medgpa))
-                data.at[row.Index, "Grad_Rank"] = rank
-                data.at[row.Index, "Grad_GPA_Norm"] = grgpa
+        if not cache:
+            data = self.parseData(fname)
+        else:
+            key = self.dataKey(fname)
+            data = self.datacache.get(key)
+            if data is None:
+                data = self.parseData(fname)
+                self.datacache.put(key, data)
+            else:
+                self.checkRenames(data)
+
+        # the school table is only built if asked for
+        self.lastdata = data
+        self._schooltable = None
 
         return data
 
-    def readData(self, fname):
-        data = pandas.read_csv(fname, header=[0, 1])
-        data.columns = data.columns.droplevel(-1)
-        data.drop(data[data["Field Admission Decision"] == "ADMT"].index, inplace=True)
-        data.reset_index(drop=True, inplace=True)
-
-        data = data.drop(
-            columns=[
-                "Assigned",
-                "In Progress",
-                "Completed",
-                "Tags",
-                "Field Admission Decision",
-                "Admit Term (requested)",
-                "Admit Term (offered)",
-                "Application Date Submitted",
-                "Application Status",
-                "Applicant Decision",
-                "Admit Program (offered)",
-                "Decision Layout",
-            ],
-            errors="ignore",
+    def dataKey(self, fname):
+        """Hash of an export, the rename sheet, and the cleaning schema"""
+
+        sha = hashlib.sha256()
+        with open(fname, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        sha.update(
+            pandas.util.hash_pandas_object(
+                self.renames.astype(str), index=False
+            ).values.tobytes()
         )
+        sha.update(repr((dropcols, colrenames, schema, derivedcols)).encode())
+
+        return sha.hexdigest()
 
-        # take care of alternate col naming
-        col_rename = {"Legal Last Name": "Last Name", "Legal First Name": "First Name"}
-        data = data.rename(columns=col_rename)
+    def parseData(self, fname):
+        """Parse and clean an application export (readData without caching)"""
+
+        # normalized names of the first header row
+        raw = pandas.read_csv(fname, header=None, nrows=1).iloc[0].astype(str).values
+        names = [normcol(colrenames.get(c, c)) for c in raw]
+        usecols = [
+            n
+            for c, n in zip(raw, names)
+            if (c not in dropcols) or (c == "Field Admission Decision")
+        ]
+
+        # numeric columns are read as strings, and only cast once overrides
+        # (which may fix unparseable entries) are applied
+        numeric = [n for n in usecols if schema.get(n) == "Float64"]
+        data = pandas.read_csv(
+            fname,
+            header=None,
+            skiprows=2,
+            names=names,
+            usecols=usecols,
+            dtype={
+                n: str if n in numeric else schema[n] for n in usecols if n in schema
+            },
+        )
+        if "Field_Admission_Decision" in data:
+            data = data[data["Field_Admission_Decision"] != "ADMT"]
+            data = data.drop(columns=["Field_Admission_Decision"])
+        data = data.reset_index(drop=True)
 
         # add some new columns
-        data["UGrad School"] = None
-        data["UGrad GPA"] = None
-        data["Grad School"] = None
-        data["Grad GPA"] = None
-        data["UGrad GPA 4pt"] = None
-        data["Grad GPA 4pt"] = None
-        data["UGrad GPA Norm"] = None
-        data["Grad GPA Norm"] = None
-        data["UGrad Rank"] = None
-        data["Grad Rank"] = None
-        data["Total"] = None
-
-        # remove all column name spaces and special chars
-        data.columns = data.columns.str.strip()
-        data.columns = data.columns.str.replace(" ", "_")
-        data.columns = data.columns.str.replace("?", "")
-        data.columns = data.columns.str.replace("(", "")
-        data.columns = data.columns.str.replace(")", "")
-        data.columns = data.columns.str.replace('"', "")
+        for col, dtype in derivedcols.items():
+            data[col] = pandas.Series(index=data.index, dtype=dtype)
 
         # add full name col
-        fullname = [
-            "{}, {}".format(row.Last_Name, row.First_Name) for row in data.itertuples()
-        ]
-        data["Full_Name"] = fullname
+        data["Full_Name"] = (
+            data["Last_Name"].astype(str) + ", " + data["First_Name"].astype(str)
+        )
 
         # overwrite all fields as needed
-        for row in self.renames.itertuples():
-            data.loc[data["Full_Name"] == row.Full_Name, row.Field] = row.Value
-
-        # make sure that numeric cols remain numeric
-        numcols = [
-            "Verbal_GRE_Unofficial",
-            "Quantitative_GRE_Unofficial",
-            "GRE_Analytical_Writing_GRE_Unofficial",
-            "UGrad_GPA_4pt",
-            "Grad_GPA_4pt",
-        ]
-        for j in range(1, 4):
-            numcols.append("GPA_School_{}".format(j))
-            numcols.append("GPA_Scale_School_{}".format(j))
-
-        for col in numcols:
-            if col in data:
-                data[col] = data[col].astype(float)
+        self.overlayRenames(data)
+
+        for col in numeric:
+            vals = pandas.to_numeric(data[col], errors="coerce")
+            bad = vals.isnull() & data[col].notnull()
+            if bad.any():
+                raise ValueError(
+                    "Non-numeric {} for {} (add a rename override to fix).".format(
+                        col, ", ".join(data.loc[bad, "Full_Name"])
+                    )
+                )
+            data[col] = vals.astype("Float64")
 
         return data
+
+    def checkRenames(self, data):
+        """Report overrides for applicants not in data (see overlayRenames)
+
+        Returns the deduplicated overrides and a mask of those that apply.
+        """
+
+        renames = self.renames.drop_duplicates(
+            subset=["Full_Name", "Field"], keep="last"
+        )
+        found = renames["Full_Name"].isin(data["Full_Name"])
+        self.orphanrenames = renames[~found].reset_index(drop=True)
+        if len(self.orphanrenames):
+            print(
+                "{} overrides for applicants not in this data set: {}".format(
+                    len(self.orphanrenames),
+                    ", ".join(self.orphanrenames["Full_Name"].unique()),
+                )
+            )
+
+        return renames, found
+
+    def overlayRenames(self, data):
+        """Apply all rename overrides to data (in place)
+
+        data - DataFrame from readData
+
+        Overrides are aligned on Full_Name and applied one field at a time.
+        Later overrides of the same field win.  Overrides for applicants not
+        in data are reported and kept in self.orphanrenames.
+        """
+
+        renames, found = self.checkRenames(data)
+
+        rows = data[["Full_Name"]].reset_index()
+        for field, group in renames[found].groupby("Field", sort=False):
+            hits = rows.merge(group[["Full_Name", "Value"]], on="Full_Name")
+            if field not in data:
+                data[field] = pandas.Series(index=data.index, dtype=object)
+            col = data[field]
+            vals = hits["Value"]
+            if isinstance(col.dtype, pandas.CategoricalDtype):
+                new = vals[~vals.isin(col.cat.categories)].unique()
+                if len(new):
+                    data[field] = col.cat.add_categories(new)
+            elif col.dtype != object:
+                vals = vals.astype(col.dtype)
+            data.loc[hits["index"].values, field] = vals.values
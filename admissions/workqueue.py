@@ -0,0 +1,136 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+
+
+def defaultowner():
+    """user@host:pid, identifying one operator session"""
+
+    try:
+        import getpass
+
+        user = getpass.getuser()
+    except Exception:  # noqa
+        user = "unknown"
+    return "{}@{}:{}".format(user, socket.gethostname(), os.getpid())
+
+
+class WorkQueue:
+    """Shared queue of work items with per-item leases (SQLite)
+
+    dbfile (str) - queue database (created if missing), on a filesystem all
+        operators can reach
+    lease (float) - seconds an item stays leased before anyone else may
+        take it over
+
+    Items are keyed (by applicant name, say), so adding the same item twice
+    is harmless.  An item is open, leased (to one owner, until its lease
+    expires) or done.  Leasing happens in a single write transaction, so two
+    operators can never be handed the same item.
+    """
+
+    def __init__(self, dbfile, lease=600):
+        self.dbfile = dbfile
+        self.lease = lease
+        self.conn = sqlite3.connect(dbfile, timeout=30, isolation_level=None)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS items (key TEXT PRIMARY KEY, kind TEXT, "
+            "payload TEXT, status TEXT, owner TEXT, expires REAL, result TEXT, "
+            "updated REAL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_items ON items (status, expires)"
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def add(self, key, kind, payload=None):
+        """Queue an item (ignored if key is already queued)
+
+        Returns True if the item is new.
+        """
+
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO items VALUES (?, ?, ?, 'open', NULL, NULL, NULL, ?)",
+            (key, kind, json.dumps(payload, default=str), time.time()),
+        )
+        return cur.rowcount == 1
+
+    def take(self, owner, n=1, kind=None):
+        """Lease up to n open (or expired) items to owner
+
+        Returns a list of (key, kind, payload) tuples, oldest first.
+        """
+
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            query = (
+                "SELECT key, kind, payload FROM items WHERE (status = 'open' OR "
+                "(status = 'leased' AND expires < ?))"
+            )
+            args = [now]
+            if kind is not None:
+                query += " AND kind = ?"
+                args.append(kind)
+            query += " ORDER BY updated LIMIT ?"
+            args.append(n)
+            items = self.conn.execute(query, args).fetchall()
+            self.conn.executemany(
+                "UPDATE items SET status = 'leased', owner = ?, expires = ?, "
+                "updated = ? WHERE key = ?",
+                [(owner, now + self.lease, now, key) for key, _, _ in items],
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        return [(key, k, json.loads(payload)) for key, k, payload in items]
+
+    def _update(self, key, owner, status, expires=None, result=None):
+        cur = self.conn.execute(
+            "UPDATE items SET status = ?, owner = ?, expires = ?, result = ?, "
+            "updated = ? WHERE key = ? AND owner = ? AND status = 'leased'",
+            (
+                status,
+                owner if status != "open" else None,
+                expires,
+                json.dumps(result, default=str),
+                time.time(),
+                key,
+                owner,
+            ),
+        )
+        return cur.rowcount == 1
+
+    def renew(self, key, owner):
+        """Extend owner's lease on key.  False if the lease was lost."""
+
+        return self._update(key, owner, "leased", expires=time.time() + self.lease)
+
+    def done(self, key, owner, result=None):
+        """Mark owner's leased item as done.  False if the lease was lost."""
+
+        return self._update(key, owner, "done", result=result)
+
+    def release(self, key, owner):
+        """Give a leased item back to the queue"""
+
+        return self._update(key, owner, "open")
+
+    def counts(self):
+        """dict of status -> number of items (expired leases count as open)"""
+
+        out = {"open": 0, "leased": 0, "done": 0}
+        for status, expired, n in self.conn.execute(
+            "SELECT status, expires < ?, COUNT(*) FROM items GROUP BY 1, 2",
+            (time.time(),),
+        ):
+            if (status == "leased") and expired:
+                status = "open"
+            out[status] += n
+        return out
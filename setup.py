@@ -41,6 +41,7 @@ setuptools.setup(
         "ortools",
         "pdfminer",
     ],
+    extras_require={"feather": ["pyarrow"]},
     classifiers=[
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
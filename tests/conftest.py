@@ -0,0 +1,103 @@
+import csv
+import pandas
+import pytest
+import admissions.countries
+from admissions.utils import utils
+
+
+def writeFixtures(d):
+    lookup = pandas.DataFrame(
+        {
+            "Name": [
+                "Cornell University",
+                "Indian Institute of Technology Bombay",
+                "Indian Institute of Technology Delhi",
+            ],
+            "Rank": [9, 50, 60],
+            "Country": ["United States", "India", "India"],
+        }
+    )
+    with pandas.ExcelWriter(d / "university_rankings.xlsx") as ew:
+        lookup.to_excel(ew, sheet_name="lookup", index=False)
+    with pandas.ExcelWriter(d / "university_aliases.xlsx") as ew:
+        pandas.DataFrame({"Alias": [], "Standard Name": []}).to_excel(
+            ew, sheet_name="aliases", index=False
+        )
+        pandas.DataFrame({"Name": [], "Country": []}).to_excel(
+            ew, sheet_name="ignore", index=False
+        )
+    with pandas.ExcelWriter(d / "grade_data.xlsx") as ew:
+        pandas.DataFrame(
+            {
+                "Name": ["DEFAULT India"],
+                "Country": ["India"],
+                "GPAScale": [10],
+                "SchoolGPA": ["10/8/6"],
+                "4ptGPA": ["4/3.5/2.5"],
+            }
+        ).to_excel(ew, sheet_name="grades", index=False)
+    with pandas.ExcelWriter(d / "util.xlsx") as ew:
+        pandas.DataFrame({"Full_Name": [], "Field": [], "Value": []}).to_excel(
+            ew, sheet_name="rename", index=False
+        )
+        pandas.DataFrame({"Full_Name": [], "UG_School": [], "GR_School": []}).to_excel(
+            ew, sheet_name="schools", index=False
+        )
+
+    # application export, with its two header rows
+    cols = [
+        "Last Name",
+        "First Name",
+        "Field Admission Decision",
+        "Concentration 1",
+        "Concentration 2",
+        "Verbal GRE (Unofficial)",
+        "Quantitative GRE (Unofficial)",
+        "GRE Analytical Writing GRE (Unofficial)",
+    ]
+    for j in range(1, 4):
+        cols += [
+            "School Name {}".format(j),
+            "School Country {}".format(j),
+            "School City {}".format(j),
+            "GPA School {}".format(j),
+            "GPA Scale School {}".format(j),
+            "Degree level School {}".format(j),
+            "Earned a degree? School {}".format(j),
+        ]
+    rows = [
+        ["Doe", "Jane", "", "Optics", "", 160, 165, 4]
+        + ["Cornell University", "USA", "Ithaca", 3.5, 4, "Undergraduate", "Yes"],
+        ["Smith", "John", "", "Fluids", "", 150, 166, 3.5]
+        + ["IIT", "India", "", 8.5, 10, "Undergraduate", "Yes"],
+    ]
+    with open(d / "apps.csv", "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(cols)
+        w.writerow(["desc"] * len(cols))
+        for row in rows:
+            w.writerow(row + [""] * (len(cols) - len(row)))
+
+
+@pytest.fixture
+def makeutils(tmp_path, monkeypatch):
+    """Factory for utils on small reference workbooks in tmp_path"""
+
+    monkeypatch.setattr(
+        admissions.countries, "cachefile", str(tmp_path / "countries.json")
+    )
+    writeFixtures(tmp_path)
+
+    def make(**kwargs):
+        return utils(
+            str(tmp_path / "util.xlsx"),
+            str(tmp_path / "university_rankings.xlsx"),
+            str(tmp_path / "university_aliases.xlsx"),
+            str(tmp_path / "grade_data.xlsx"),
+            batch=True,
+            decisionfile=str(tmp_path / "decisions.json"),
+            prefetch=0,
+            **kwargs
+        )
+
+    return make
@@ -0,0 +1,51 @@
+import ast
+import builtins
+import os
+import subprocess
+import sys
+
+# dependencies that must only be loaded by the functions that need them
+heavy = ["scipy", "matplotlib", "fuzzywuzzy", "country_converter", "cornellGrading"]
+
+
+def test_lazy_imports():
+    code = (
+        "import sys\n"
+        "import admissions.utils, admissions.rankings, admissions.reading\n"
+        "print(','.join(m for m in {!r} if m in sys.modules))\n".format(heavy)
+    )
+    res = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+
+    assert res.stdout.strip() == ""
+
+
+def test_rankings_script_names():
+    # 2021rankings.py scrapes on import, so instead of running it, check that
+    # every global name it reads is defined by the script itself, its imports
+    # or admissions.rankings (via import *)
+    import admissions.rankings
+
+    fname = os.path.join(os.path.dirname(__file__), "..", "2021rankings.py")
+    with open(fname) as f:
+        tree = ast.parse(f.read())
+
+    defined = set(dir(builtins)) | {
+        n for n in dir(admissions.rankings) if not n.startswith("_")
+    }
+    used = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                used.add(node.id)
+            else:
+                defined.add(node.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            defined |= {(a.asname or a.name).split(".")[0] for a in node.names}
+        elif isinstance(node, ast.FunctionDef):
+            defined.add(node.name)
+        elif isinstance(node, ast.arg):
+            defined.add(node.arg)
+
+    assert sorted(used - defined) == []
@@ -0,0 +1,24 @@
+import json
+import os
+import re
+from admissions.workqueue import defaultowner
+
+
+def test_replay_same_pid(makeutils, tmp_path):
+    # log of a crashed session that ran with this process's pid, named the
+    # way a pid-only session name would be
+    name = re.sub(r"[^\w@.-]", "_", "{}_0".format(defaultowner()))
+    logfile = str(tmp_path / "util.xlsx.{}.log".format(name))
+    with open(logfile, "w") as f:
+        entry = ["updateAliases", ["IIT", "Indian Institute of Technology Delhi"]]
+        f.write(json.dumps(entry) + "\n")
+
+    u = makeutils()
+    assert u.logfile != logfile
+    assert u.index.alias("IIT") == "Indian Institute of Technology Delhi"
+
+    # taken over, and saved with this session's decisions
+    assert not os.path.exists(logfile)
+    u.save()
+    u = makeutils()
+    assert u.index.alias("IIT") == "Indian Institute of Technology Delhi"
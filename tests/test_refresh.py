@@ -0,0 +1,36 @@
+def test_refresh_alias(makeutils, tmp_path, capsys):
+    u = makeutils()
+
+    def refresh():
+        data = u.readData(str(tmp_path / "apps.csv"))
+        return u.refreshSchoolData(data).set_index("Full_Name")
+
+    # an earlier decision, then an alias (which takes precedence over it)
+    u.decisions.put(
+        "IIT",
+        "India",
+        None,
+        "Indian Institute of Technology Bombay",
+        stamp=u.index.countrystamp("India"),
+    )
+    data = refresh()
+    smith = data.loc["Smith, John"]
+    assert smith["UGrad_School"] == "Indian Institute of Technology Bombay"
+    assert smith["UGrad_Rank"] == 50
+
+    # nothing changed: everything is reused
+    capsys.readouterr()
+    refresh()
+    assert "Reused 2 applicants, recomputed 0." in capsys.readouterr().out
+
+    # the new alias must invalidate the cached row, and give the same result
+    # as a full recompute
+    u.updateAliases("IIT", "Indian Institute of Technology Delhi")
+    data = refresh()
+    full = u.fillSchoolData(u.readData(str(tmp_path / "apps.csv")))
+    full = full.set_index("Full_Name")
+    smith = data.loc["Smith, John"]
+    assert smith["UGrad_School"] == "Indian Institute of Technology Delhi"
+    assert smith["UGrad_Rank"] == 60
+    for col in ["UGrad_School", "UGrad_Rank", "UGrad_GPA_Norm"]:
+        assert smith[col] == full.loc["Smith, John", col]
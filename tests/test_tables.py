@@ -0,0 +1,68 @@
+import os
+import threading
+import pandas
+from admissions.tables import FileLock, FrameCache, atomicwrite
+
+
+def test_framecache_writable(tmp_path):
+    data = pandas.DataFrame(
+        {
+            "School_Name_1": pandas.Series(["A", "B", "A"], dtype="category"),
+            "GPA_School_1": pandas.Series([3.5, None, 90], dtype="Float64"),
+            "Rank": [1.0, 2.0, 3.0],
+        }
+    )
+    cache = FrameCache(str(tmp_path))
+    cache.put("key", data)
+
+    cached = cache.get("key")
+    pandas.testing.assert_frame_equal(cached, data)
+
+    # cached frames must be as writable as freshly parsed ones
+    cached.loc[0, "School_Name_1"] = "B"
+    cached.loc[1, "GPA_School_1"] = 4.0
+    cached.loc[2, "Rank"] = 4.0
+    cached["School_Name_1"] = cached["School_Name_1"].cat.add_categories(["C"])
+    cached.loc[2, "School_Name_1"] = "C"
+
+
+def test_filelock_cleanup(tmp_path):
+    fname = str(tmp_path / "counter")
+    with open(fname, "w") as f:
+        f.write("0")
+
+    def work():
+        for _ in range(200):
+            with FileLock(fname):
+                with open(fname) as f:
+                    n = int(f.read())
+                with open(fname, "w") as f:
+                    f.write(str(n + 1))
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # no lost updates, and no lock file left behind
+    with open(fname) as f:
+        assert int(f.read()) == 800
+    assert sorted(os.listdir(tmp_path)) == ["counter"]
+
+
+def test_atomicwrite(tmp_path):
+    fname = str(tmp_path / "out.json")
+    with atomicwrite(fname) as f:
+        f.write("old")
+
+    # a failed write leaves the old contents and no temporary file
+    try:
+        with atomicwrite(fname) as f:
+            f.write("partial")
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    with open(fname) as f:
+        assert f.read() == "old"
+    assert os.listdir(tmp_path) == ["out.json"]
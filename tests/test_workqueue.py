@@ -0,0 +1,23 @@
+import time
+from admissions.workqueue import WorkQueue
+
+
+def test_lease_renewed_per_decision(makeutils, tmp_path):
+    u = makeutils()
+    data = u.readData(str(tmp_path / "apps.csv"))
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease=0.5)
+    u.queueApplicants(data.iloc[:1], queue)
+
+    # a slow operator: decisions spaced out over more than one lease
+    taken = []
+
+    def assignschools(rows):
+        for j in range(4):
+            time.sleep(0.3)
+            u.updateAliases("School {}".format(j), "Cornell University")
+        taken.extend(queue.take("someone else", kind="applicant"))
+
+    u.assignschools = assignschools
+    assert u.workQueue(data, queue, owner="me") == 1
+    assert taken == []
+    assert queue.counts()["done"] == 1